@@ -8,16 +8,21 @@ import tzlocal
 class Clock(object):
     """A wrapper for managing clock time functions."""
 
-    def wait(self, wait_time_seconds):
+    def wait(self, wait_time_seconds, interrupt_event=None):
         """Wait for the specified number of seconds.
 
         Args:
             wait_time_seconds: Number of seconds to wait.
+            interrupt_event: An optional threading.Event that ends the wait
+                early when it is set.
         """
         if wait_time_seconds < 0.0:
             raise ValueError('Wait time cannot be negative: %f' %
                              wait_time_seconds)
-        time.sleep(wait_time_seconds)
+        if interrupt_event:
+            interrupt_event.wait(wait_time_seconds)
+        else:
+            time.sleep(wait_time_seconds)
 
     def now(self):
         return datetime.datetime.now(tz=pytz.utc)
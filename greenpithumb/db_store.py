@@ -1,5 +1,170 @@
 import collections
+import datetime
+import os
+import re
+import sqlite3
+
 from dateutil import parser
+import pytz
+
+# ciso8601 is an optional C extension that parses ISO 8601 timestamps roughly
+# an order of magnitude faster than the pure-Python fallback below.
+try:
+    import ciso8601
+except ImportError:
+    ciso8601 = None
+
+# Path to the SQL script that creates GreenPiThumb's database tables.
+_CREATE_TABLES_SCRIPT_PATH = os.path.join(
+    os.path.dirname(__file__), 'sql', 'create_tables.sql')
+
+# Tables whose rows are retrieved in timestamp order, and so need an index on
+# their timestamp column.
+_TIMESTAMP_INDEXED_TABLES = ('temperature', 'ambient_humidity', 'soil_moisture',
+                             'ambient_light', 'reservoir_level',
+                             'watering_events')
+
+# Connection settings tuned for frequent small inserts on SD card storage.
+# Write-ahead logging with synchronous=NORMAL only fsyncs at checkpoints rather
+# than on every commit, and lets readers proceed while a write is in progress.
+# Memory-mapping the first 64 MB of the database file lets full-table reads
+# access pages directly instead of issuing a read() call for each one.
+_CONNECTION_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-2000',
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA mmap_size=67108864',
+]
+
+# Settings applied while a new database's schema is created. If creation fails,
+# the partial database file is deleted so that creation can simply be rerun,
+# which makes journaling and syncing unnecessary until the schema is in place.
+_CREATE_DB_PRAGMAS = [
+    'PRAGMA journal_mode=OFF',
+    'PRAGMA synchronous=OFF',
+]
+
+# Matches the ISO 8601 timestamps written by _serialize_timestamp. Accepts a
+# space as the date/time separator and optional microseconds and UTC offset.
+_TIMESTAMP_PATTERN = re.compile(
+    r'^(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})(?:\.(\d{6}))?'
+    r'(?:([+-])(\d{2}):(\d{2}))?$')
+
+# Records of individual readings and events. Pollers queue these for the
+# database writer, and the stores return them from retrieve_* queries.
+SoilMoistureRecord = collections.namedtuple('SoilMoistureRecord',
+                                            ['timestamp', 'soil_moisture'])
+AmbientLightRecord = collections.namedtuple('AmbientLightRecord',
+                                            ['timestamp', 'ambient_light'])
+HumidityRecord = collections.namedtuple('HumidityRecord',
+                                        ['timestamp', 'humidity'])
+ReservoirLevelRecord = collections.namedtuple('ReservoirLevelRecord',
+                                              ['timestamp', 'reservoir_level'])
+TemperatureRecord = collections.namedtuple('TemperatureRecord',
+                                           ['timestamp', 'temperature'])
+WateringEventRecord = collections.namedtuple('WateringEventRecord',
+                                             ['timestamp', 'water_pumped'])
+
+
+def open_or_create_db(db_path):
+    """Opens a connection to a database, creating the database if needed.
+
+    Args:
+        db_path: Path to the SQLite database file.
+
+    Returns:
+        A connection to the SQLite database.
+    """
+    if os.path.exists(db_path):
+        return _open_db(db_path)
+    return _create_db(db_path)
+
+
+def _connect(db_path):
+    """Opens a connection to a database without applying any settings.
+
+    Args:
+        db_path: Path to the SQLite database file.
+
+    Returns:
+        A connection to the SQLite database.
+    """
+    # The connection is handed off to the database writer's thread, which is
+    # then the only thread that uses it.
+    return sqlite3.connect(
+        db_path, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+
+
+def _execute_pragmas(connection, pragmas):
+    """Applies a list of PRAGMA statements to a database connection.
+
+    Args:
+        connection: SQLite database connection.
+        pragmas: A list of PRAGMA statements to execute.
+    """
+    for pragma in pragmas:
+        connection.execute(pragma)
+
+
+def _create_timestamp_indexes(connection):
+    """Creates any missing timestamp indexes in a database.
+
+    Databases created before the indexes were added to the schema get them the
+    next time they are opened, so that retrieving records in timestamp order
+    does not require sorting the whole table.
+
+    Args:
+        connection: SQLite database connection.
+    """
+    table_names = set(row[0]
+                      for row in connection.execute(
+                          "SELECT name FROM sqlite_master WHERE type='table'"))
+    for table_name in _TIMESTAMP_INDEXED_TABLES:
+        if table_name in table_names:
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS %s_timestamp_index ON %s '
+                '(timestamp)' % (table_name, table_name))
+    connection.commit()
+
+
+def _open_db(db_path):
+    """Opens a connection to a database and applies connection settings.
+
+    Args:
+        db_path: Path to the SQLite database file.
+
+    Returns:
+        A connection to the SQLite database.
+    """
+    connection = _connect(db_path)
+    _execute_pragmas(connection, _CONNECTION_PRAGMAS)
+    _create_timestamp_indexes(connection)
+    return connection
+
+
+def _create_db(db_path):
+    """Creates a new database and its tables.
+
+    Args:
+        db_path: Path to the SQLite database file to create.
+
+    Returns:
+        A connection to the newly created SQLite database.
+    """
+    connection = _connect(db_path)
+    try:
+        _execute_pragmas(connection, _CREATE_DB_PRAGMAS)
+        with open(_CREATE_TABLES_SCRIPT_PATH) as script_file:
+            connection.executescript(script_file.read())
+        _create_timestamp_indexes(connection)
+    except Exception:
+        connection.close()
+        os.remove(db_path)
+        raise
+    _execute_pragmas(connection, _CONNECTION_PRAGMAS)
+    return connection
 
 
 def _serialize_timestamp(timestamp):
@@ -14,9 +179,88 @@ def _serialize_timestamp(timestamp):
     return timestamp.isoformat('T')
 
 
+# Serialize datetime query parameters as soon as sqlite3 binds them, so that
+# callers can pass timestamps straight to execute().
+sqlite3.register_adapter(datetime.datetime, _serialize_timestamp)
+
+
+def _parse_iso8601_timestamp_python(timestamp):
+    """Converts an ISO 8601 string to a timestamp.
+
+    Pure-Python implementation used when the ciso8601 C extension is not
+    installed.
+
+    Args:
+        timestamp: Timestamp as a string in the format written by
+            _serialize_timestamp.
+
+    Returns:
+        Timestamp as a datetime object, or None if the string is not in the
+        expected format.
+    """
+    match = _TIMESTAMP_PATTERN.match(timestamp)
+    if not match:
+        return None
+    (year, month, day, hour, minute, second, microsecond, offset_sign,
+     offset_hours, offset_minutes) = match.groups()
+    tzinfo = None
+    if offset_sign:
+        offset = int(offset_hours) * 60 + int(offset_minutes)
+        if offset_sign == '-':
+            offset = -offset
+        tzinfo = pytz.FixedOffset(offset)
+    return datetime.datetime(
+        int(year),
+        int(month),
+        int(day),
+        int(hour),
+        int(minute),
+        int(second),
+        int(microsecond or 0),
+        tzinfo=tzinfo)
+
+
+if ciso8601:
+    _parse_iso8601_timestamp = ciso8601.parse_datetime
+else:
+    _parse_iso8601_timestamp = _parse_iso8601_timestamp_python
+
+
+def _parse_timestamp(timestamp):
+    """Converts a string to a timestamp.
+
+    Parses the ISO 8601 format written by _serialize_timestamp directly, and
+    falls back to the much slower general-purpose parser for any other format.
+
+    Args:
+        timestamp: Timestamp as a string.
+
+    Returns:
+        Timestamp as a datetime object.
+    """
+    try:
+        parsed = _parse_iso8601_timestamp(timestamp)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        return parser.parse(timestamp)
+    return parsed
+
+
+# Parse values from columns declared as TIMESTAMP as sqlite3 reads each row.
+# This replaces sqlite3's built-in TIMESTAMP converter, which cannot parse the
+# 'T' separator or UTC offset that _serialize_timestamp writes.
+sqlite3.register_converter('TIMESTAMP', _parse_timestamp)
+
+
 class DbStoreBase(object):
     """Base class for storing information in a database."""
 
+    # INSERT statement with placeholders for timestamp and value. Subclasses
+    # define this as a constant so that every insert reuses the same string and
+    # hits SQLite's compiled statement cache.
+    _INSERT_SQL = None
+
     def __init__(self, cursor):
         """Creates a new DbStoreBase object for storing information.
 
@@ -25,10 +269,64 @@ class DbStoreBase(object):
         """
         self._cursor = cursor
 
+    def _do_insert(self, timestamp, value):
+        """Inserts a timestamped value into the database.
+
+        The insert is not committed. The caller is responsible for committing
+        the transaction.
+
+        Args:
+            timestamp: A datetime object representing the time of the value.
+            value: The value to insert.
+        """
+        self._cursor.execute(self._INSERT_SQL, (timestamp, value))
+
+    def store_many(self, readings):
+        """Inserts many timestamped values into the database in one statement.
+
+        The inserts are not committed. The caller is responsible for committing
+        the transaction.
+
+        Args:
+            readings: A list of (timestamp, value) tuples to insert.
+        """
+        self._cursor.executemany(self._INSERT_SQL, readings)
+
+    def _do_get(self, sql, record_type):
+        """Retrieves timestamped records from the database.
+
+        Args:
+            sql: A SELECT statement that returns rows of timestamp and value.
+            record_type: A namedtuple type with timestamp and value fields.
+
+        Returns:
+            A list of record_type objects.
+        """
+        self._cursor.execute(sql)
+        # Timestamp columns are declared as TIMESTAMP, so sqlite3 converts them
+        # to datetimes as it reads each row. Databases created before that
+        # declaration still return strings, which are parsed here instead.
+        # Readings recorded together share a timestamp string, so parse each
+        # distinct string only once.
+        parsed_timestamps = {}
+        records = []
+        # Iterate the cursor rather than calling fetchall() so that rows are
+        # converted to records as SQLite steps through them, instead of first
+        # materializing every row in an intermediate list.
+        for timestamp, value in self._cursor:
+            if isinstance(timestamp, basestring):
+                if timestamp not in parsed_timestamps:
+                    parsed_timestamps[timestamp] = _parse_timestamp(timestamp)
+                timestamp = parsed_timestamps[timestamp]
+            records.append(record_type(timestamp, value))
+        return records
+
 
 class SoilMoistureStore(DbStoreBase):
     """Stores and retrieves timestamp and soil moisture readings."""
 
+    _INSERT_SQL = 'INSERT INTO soil_moisture VALUES (?, ?)'
+
     def store_soil_moisture(self, timestamp, soil_moisture):
         """Inserts moisture and timestamp info into an SQLite database.
 
@@ -37,8 +335,7 @@ class SoilMoistureStore(DbStoreBase):
                 moisture reading.
             soil_moisture: An int of the soil moisture reading.
         """
-        self._cursor.execute('INSERT INTO soil_moisture VALUES (?, ?)',
-                             (_serialize_timestamp(timestamp), soil_moisture))
+        self._do_insert(timestamp, soil_moisture)
 
     def latest_soil_moisture(self):
         """Returns the most recent soil moisture reading."""
@@ -57,21 +354,18 @@ class SoilMoistureStore(DbStoreBase):
         """Retrieves timestamp and soil moisture readings.
 
         Returns:
-            A list of objects with 'timestamp' and 'soil_moisture' fields.
+            A list of objects with 'timestamp' and 'soil_moisture' fields,
+                ordered by timestamp.
         """
-        self._cursor.execute('SELECT * FROM soil_moisture')
-        data = []
-        for row in self._cursor.fetchall():
-            data.append((parser.parse(row[0]), row[1]))
-        SoilMoistureRecord = collections.namedtuple(
-            'SoilMoistureRecord', ['timestamp', 'soil_moisture'])
-        soil_moisture_data = map(SoilMoistureRecord._make, data)
-        return soil_moisture_data
+        return self._do_get('SELECT * FROM soil_moisture ORDER BY timestamp',
+                            SoilMoistureRecord)
 
 
 class AmbientLightStore(DbStoreBase):
     """Stores timestamp and ambient light readings."""
 
+    _INSERT_SQL = 'INSERT INTO ambient_light VALUES (?, ?)'
+
     def store_ambient_light(self, timestamp, ambient_light):
         """Inserts ambient light and timestamp info into an SQLite database.
 
@@ -80,28 +374,24 @@ class AmbientLightStore(DbStoreBase):
                 light reading.
             ambient_light: A float of the ambient light level.
         """
-        self._cursor.execute('INSERT INTO ambient_light VALUES (?, ?)',
-                             (_serialize_timestamp(timestamp), ambient_light))
+        self._do_insert(timestamp, ambient_light)
 
     def retrieve_ambient_light(self):
         """Retrieves timestamp and ambient light readings.
 
         Returns:
-            A list of objects with 'timestamp' and 'ambient_light' fields.
+            A list of objects with 'timestamp' and 'ambient_light' fields,
+                ordered by timestamp.
         """
-        self._cursor.execute('SELECT * FROM ambient_light')
-        data = []
-        for row in self._cursor.fetchall():
-            data.append((parser.parse(row[0]), row[1]))
-        AmbientLightRecord = collections.namedtuple(
-            'AmbientLightRecord', ['timestamp', 'ambient_light'])
-        ambient_light_data = map(AmbientLightRecord._make, data)
-        return ambient_light_data
+        return self._do_get('SELECT * FROM ambient_light ORDER BY timestamp',
+                            AmbientLightRecord)
 
 
 class HumidityStore(DbStoreBase):
     """Stores timestamp and ambient humidity readings."""
 
+    _INSERT_SQL = 'INSERT INTO ambient_humidity VALUES (?, ?)'
+
     def store_humidity(self, timestamp, humidity):
         """Inserts humidity and timestamp info into an SQLite database.
 
@@ -110,28 +400,24 @@ class HumidityStore(DbStoreBase):
                 humidity reading.
             humidity: A float of the humidity reading.
         """
-        self._cursor.execute('INSERT INTO ambient_humidity VALUES (?, ?)',
-                             (_serialize_timestamp(timestamp), humidity))
+        self._do_insert(timestamp, humidity)
 
     def retrieve_humidity(self):
         """Retrieves timestamp and relative humidity readings.
 
         Returns:
-            A list of objects with 'timestamp' and 'humidity' fields.
+            A list of objects with 'timestamp' and 'humidity' fields,
+                ordered by timestamp.
         """
-        self._cursor.execute('SELECT * FROM ambient_humidity')
-        data = []
-        for row in self._cursor.fetchall():
-            data.append((parser.parse(row[0]), row[1]))
-        HumidityRecord = collections.namedtuple('HumidityRecord',
-                                                ['timestamp', 'humidity'])
-        humidity_data = map(HumidityRecord._make, data)
-        return humidity_data
+        return self._do_get('SELECT * FROM ambient_humidity ORDER BY timestamp',
+                            HumidityRecord)
 
 
 class ReservoirLevelStore(DbStoreBase):
     """Stores timestamp and reservoir level readings."""
 
+    _INSERT_SQL = 'INSERT INTO reservoir_level VALUES (?, ?)'
+
     def store_reservoir_level(self, timestamp, reservoir_level):
         """Inserts reservoir level and timestamp info into an SQLite database.
 
@@ -140,28 +426,24 @@ class ReservoirLevelStore(DbStoreBase):
                 reservoir level reading.
             reservoir_level: A float of the reservoir level reading in mL.
         """
-        self._cursor.execute('INSERT INTO reservoir_level VALUES (?, ?)',
-                             (_serialize_timestamp(timestamp), reservoir_level))
+        self._do_insert(timestamp, reservoir_level)
 
     def retrieve_reservoir_level(self):
         """Retrieves timestamp and reservoir level readings.
 
         Returns:
-            A list of objects with 'timestamp' and 'reservoir_level' fields.
+            A list of objects with 'timestamp' and 'reservoir_level' fields,
+                ordered by timestamp.
         """
-        self._cursor.execute('SELECT * FROM reservoir_level')
-        data = []
-        for row in self._cursor.fetchall():
-            data.append((parser.parse(row[0]), row[1]))
-        ReservoirLevelRecord = collections.namedtuple(
-            'ReservoirLevelRecord', ['timestamp', 'reservoir_level'])
-        reservoir_level_data = map(ReservoirLevelRecord._make, data)
-        return reservoir_level_data
+        return self._do_get('SELECT * FROM reservoir_level ORDER BY timestamp',
+                            ReservoirLevelRecord)
 
 
 class TemperatureStore(DbStoreBase):
     """Stores timestamp and ambient temperature readings."""
 
+    _INSERT_SQL = 'INSERT INTO temperature VALUES (?, ?)'
+
     def store_temperature(self, timestamp, temperature):
         """Inserts temperature and timestamp info into an SQLite database.
 
@@ -170,28 +452,24 @@ class TemperatureStore(DbStoreBase):
                 temperature reading.
             temperature: A float of the temperature reading in Celsius.
         """
-        self._cursor.execute('INSERT INTO temperature VALUES (?, ?)',
-                             (_serialize_timestamp(timestamp), temperature))
+        self._do_insert(timestamp, temperature)
 
     def retrieve_temperature(self):
         """Retrieves timestamp and temperature(C) readings.
 
         Returns:
-            A list of objects with 'timestamp' and 'temperature' fields.
+            A list of objects with 'timestamp' and 'temperature' fields,
+                ordered by timestamp.
         """
-        self._cursor.execute('SELECT * FROM temperature')
-        data = []
-        for row in self._cursor.fetchall():
-            data.append((parser.parse(row[0]), row[1]))
-        TemperatureRecord = collections.namedtuple('TemperatureRecord',
-                                                   ['timestamp', 'temperature'])
-        temperature_data = map(TemperatureRecord._make, data)
-        return temperature_data
+        return self._do_get('SELECT * FROM temperature ORDER BY timestamp',
+                            TemperatureRecord)
 
 
 class WateringEventStore(DbStoreBase):
     """Stores timestamp and volume of water pumped to plant."""
 
+    _INSERT_SQL = 'INSERT INTO watering_events VALUES (?, ?)'
+
     def store_water_pumped(self, timestamp, water_pumped):
         """Inserts water volume and timestamp info into an SQLite database.
 
@@ -199,20 +477,14 @@ class WateringEventStore(DbStoreBase):
             timestamp: A datetime object representing the time of the reading.
             water_pumped: A float of the water volume pumped in mL.
         """
-        self._cursor.execute('INSERT INTO watering_events VALUES (?, ?)',
-                             (_serialize_timestamp(timestamp), water_pumped))
+        self._do_insert(timestamp, water_pumped)
 
     def retrieve_water_pumped(self):
         """Retrieves timestamp and volume of water pumped(in mL).
 
         Returns:
-            A list of objects with 'timestamp' and 'water_pumped' fields.
-        """
-        self._cursor.execute('SELECT * FROM watering_events')
-        data = []
-        for row in self._cursor.fetchall():
-            data.append((parser.parse(row[0]), row[1]))
-        WateringEventRecord = collections.namedtuple(
-            'WateringEventRecord', ['timestamp', 'water_pumped'])
-        watering_event_data = map(WateringEventRecord._make, data)
-        return watering_event_data
+            A list of objects with 'timestamp' and 'water_pumped' fields,
+                ordered by timestamp.
+        """
+        return self._do_get('SELECT * FROM watering_events ORDER BY timestamp',
+                            WateringEventRecord)
@@ -0,0 +1,142 @@
+import collections
+import logging
+import Queue
+import sqlite3
+import threading
+
+import db_store
+
+logger = logging.getLogger(__name__)
+
+# Kinds of records that can be placed on the record queue. A record is a
+# (kind, timestamp, value) tuple.
+SOIL_MOISTURE = 'soil_moisture'
+AMBIENT_LIGHT = 'ambient_light'
+HUMIDITY = 'humidity'
+RESERVOIR_LEVEL = 'reservoir_level'
+TEMPERATURE = 'temperature'
+WATERING_EVENT = 'watering_event'
+
+# Maximum number of items the record queue holds. Pollers drop records rather
+# than wait when the queue is full.
+_RECORD_QUEUE_MAXSIZE = 256
+
+# Maximum number of queue items to write in a single transaction.
+_MAX_BATCH_SIZE = 32
+
+
+def create_record_queue(maxsize=_RECORD_QUEUE_MAXSIZE):
+    """Creates a bounded queue for passing records to a DbWriter.
+
+    Bounding the queue keeps memory use in check if the writer stalls.
+
+    Args:
+        maxsize: Maximum number of items the queue can hold.
+
+    Returns:
+        A Queue for records to write to the database.
+    """
+    return Queue.Queue(maxsize=maxsize)
+
+
+class DbWriter(object):
+    """Writes queued records to the database from a single thread.
+
+    Pollers place records on a shared queue rather than accessing the database
+    themselves, so DbWriter is the only user of the database connection. It
+    commits records in batches so that many inserts share one transaction.
+    """
+
+    def __init__(self, connection, record_queue):
+        """Creates a new DbWriter object.
+
+        Args:
+            connection: SQLite database connection.
+            record_queue: Queue of items to write to the database. Each item
+                is either a record tuple or a list of record tuples.
+        """
+        cursor = connection.cursor()
+        self._connection = connection
+        self._record_queue = record_queue
+        self._stores = {
+            SOIL_MOISTURE: db_store.SoilMoistureStore(cursor),
+            AMBIENT_LIGHT: db_store.AmbientLightStore(cursor),
+            HUMIDITY: db_store.HumidityStore(cursor),
+            RESERVOIR_LEVEL: db_store.ReservoirLevelStore(cursor),
+            TEMPERATURE: db_store.TemperatureStore(cursor),
+            WATERING_EVENT: db_store.WateringEventStore(cursor),
+        }
+
+    def _drain_queue(self):
+        """Takes the next batch of items from the record queue.
+
+        Blocks until an item is available, then takes any further items that
+        are already waiting, up to the maximum batch size.
+
+        Returns:
+            A list of queue items.
+        """
+        items = [self._record_queue.get()]
+        while len(items) < _MAX_BATCH_SIZE:
+            try:
+                items.append(self._record_queue.get_nowait())
+            except Queue.Empty:
+                break
+        return items
+
+    def _group_by_kind(self, items):
+        """Groups the records in queue items by their kind.
+
+        Records of an unrecognized kind are logged and skipped.
+
+        Args:
+            items: A list of queue items, each either a record tuple or a list
+                of record tuples.
+
+        Returns:
+            A dict mapping each record kind to a list of (timestamp, value)
+            tuples, in the order they were queued.
+        """
+        rows_by_kind = collections.defaultdict(list)
+        for item in items:
+            records = item if isinstance(item, list) else [item]
+            for kind, timestamp, value in records:
+                if kind not in self._stores:
+                    logger.error('Skipping record of unrecognized kind: %s',
+                                 kind)
+                    continue
+                rows_by_kind[kind].append((timestamp, value))
+        return rows_by_kind
+
+    def _write_batch(self):
+        """Writes the next batch of queued records in a single transaction.
+
+        Records of the same kind are inserted with a single statement. If the
+        database reports an error, the whole batch is rolled back and dropped.
+        """
+        rows_by_kind = self._group_by_kind(self._drain_queue())
+        try:
+            for kind, rows in rows_by_kind.iteritems():
+                self._stores[kind].store_many(rows)
+            self._connection.commit()
+        except sqlite3.Error:
+            self._connection.rollback()
+            logger.exception('Failed to write batch of records, dropping it')
+
+    def _write_forever(self):
+        """Writes queued records, forever.
+
+        Logs any unexpected error from a batch and continues with the next
+        batch. Otherwise the error would stop all further writes.
+        """
+        while True:
+            try:
+                self._write_batch()
+            except Exception:
+                logger.exception('Unexpected error while writing records')
+
+    def start_writing_async(self):
+        """Starts a new thread to begin writing records."""
+        t = threading.Thread(target=self._write_forever)
+        t.setDaemon(True)
+        t.start()
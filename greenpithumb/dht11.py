@@ -1,4 +1,3 @@
-import datetime
 import threading
 
 # Maximum time a sensor reading can be used for, in seconds
@@ -27,7 +26,7 @@ class CachingDHT11(object):
         """
         self._dht11_read_func = dht11_read_func
         self._clock = clock
-        self._last_reading_time = datetime.datetime.min
+        self._last_reading_time = None
         self._last_reading = None
         self._lock = threading.Lock()
 
@@ -39,8 +38,10 @@ class CachingDHT11(object):
         """
         with self._lock:
             now = self._clock.now()
-            if (now - self._last_reading_time).total_seconds() >= (
-                    _FRESHNESS_THRESHOLD):
+            is_cache_stale = (self._last_reading_time is None or
+                              (now - self._last_reading_time
+                              ).total_seconds() >= _FRESHNESS_THRESHOLD)
+            if is_cache_stale:
                 self._last_reading_time = now
                 self._last_reading = self._dht11_read_func()
 
@@ -1,9 +1,44 @@
+import datetime
+import heapq
+import itertools
+import logging
+import math
+import Queue
+import random
 import threading
 
+import db_writer
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of photo captures that can wait for the camera before further
+# captures are dropped.
+_MAX_PENDING_CAPTURE_REQUESTS = 2
+
+
+def _put_records(record_queue, item):
+    """Places records on a record queue, dropping them if the queue is full.
+
+    Never blocks, because a blocked put would hold up every poller sharing the
+    scheduler thread and keep the scheduler from closing promptly.
+
+    Args:
+        record_queue: Queue on which to place the records.
+        item: A record tuple or a list of record tuples.
+    """
+    try:
+        record_queue.put_nowait(item)
+    except Queue.Full:
+        logger.warning('Record queue is full, dropping %s', item)
+
 
 class SensorPollerBase(object):
     """Base class for sensor polling."""
 
+    # Pollers declare their attributes in __slots__ so that polling looks them
+    # up in fixed slots rather than in a per-instance dict.
+    __slots__ = ('_name', '_now', '_poll_interval', '_enabled')
+
     def __init__(self, local_clock, poll_interval):
         """Creates a new SensorPollerBase object for polling sensors.
 
@@ -12,27 +47,204 @@ class SensorPollerBase(object):
             poll_interval: An int of how often the sensor should be polled, in
                 seconds.
         """
-        self._local_clock = local_clock
+        self._name = type(self).__name__
+        # Bound methods are looked up once here rather than on every poll.
+        self._now = local_clock.now
         self._poll_interval = poll_interval
+        # A plain bool is enough because nothing needs to be woken when it
+        # changes. Readers (the scheduler, and CameraPoller's worker) check it
+        # before each unit of work, so they must re-check it after any wait.
+        self._enabled = True
+
+    def close(self):
+        """Stops polling this sensor.
+
+        The scheduler running this poller does not poll it again. The
+        scheduler removes it from its schedule when the poller is next due.
+        """
+        self._enabled = False
+
+
+class PollerScheduler(object):
+    """Runs many pollers from a single thread.
+
+    Keeps a heap of pollers ordered by the time each is next due to poll, and
+    sleeps until the earliest one is due. All pollers share the one thread
+    rather than each waking its own. Each poller's polls are due at fixed
+    multiples of its poll interval, regardless of how long each poll takes.
+
+    Polls run one at a time, never concurrently. The ambient light and soil
+    moisture pollers read from the same ADC, which has no locking and is not
+    safe to read from more than one thread at once.
+    """
+
+    def __init__(self, local_clock, jitter_fraction=0.0):
+        """Creates a new PollerScheduler object.
+
+        Args:
+            local_clock: A local time zone clock interface.
+            jitter_fraction: The most that any poll may be moved from its due
+                time, as a fraction of its poller's poll interval. A random
+                shift up to this amount is applied to each poll so that
+                pollers with the same interval do not all wake at once. Must
+                be at least 0 and less than 0.5.
+
+        Raises:
+            ValueError: jitter_fraction is outside the range [0, 0.5).
+        """
+        if not 0.0 <= jitter_fraction < 0.5:
+            raise ValueError('Jitter fraction must be in the range [0, 0.5): %f'
+                             % jitter_fraction)
+        self._local_clock = local_clock
+        self._jitter_fraction = jitter_fraction
+        # Heap of (next poll time, sequence number, poller) entries. The
+        # sequence number breaks ties between pollers due at the same time so
+        # that they poll in the order they were added.
+        self._schedule = []
+        self._sequence = itertools.count()
+        # The scheduler's only synchronization primitive. It both marks the
+        # scheduler as closed and wakes it from its wait for the next poll.
+        self._closed = threading.Event()
+
+    def _push(self, poll_time, poller):
+        """Schedules a poller to poll at a particular time.
+
+        Args:
+            poll_time: A datetime of when the poller should next poll.
+            poller: A SensorPollerBase instance.
+        """
+        heapq.heappush(self._schedule,
+                       (poll_time, next(self._sequence), poller))
+
+    def add(self, poller):
+        """Adds a poller to the schedule, due to poll immediately.
+
+        Pollers must be added before polling starts.
+
+        Args:
+            poller: A SensorPollerBase instance to poll at its poll interval.
+        """
+        self._push(self._local_clock.now(), poller)
+
+    def _poll_next(self):
+        """Waits until the next poller is due, then polls it.
+
+        Pollers that have been closed, including those closed while the
+        scheduler waits for them, are removed from the schedule instead of
+        being polled.
+        """
+        poll_time, _, poller = heapq.heappop(self._schedule)
+        if not poller._enabled:
+            return
+        now = self._local_clock.now()
+        wait_seconds = (poll_time - now).total_seconds()
+        if wait_seconds > poller._poll_interval:
+            # A poll is never scheduled more than one interval ahead, so the
+            # clock must have stepped backward (e.g., an NTP correction).
+            # Restart the schedule from now rather than sleeping through the
+            # step.
+            logger.warning('Clock moved backward, rescheduling pollers from '
+                           'now')
+            self._reschedule_after_clock_step(now)
+            poll_time = now
+            wait_seconds = 0
+        if self._jitter_fraction:
+            # Jitter only shifts when this poll runs. The next poll is still
+            # scheduled from the unshifted due time, so jitter never
+            # accumulates as drift.
+            wait_seconds += random.uniform(
+                -self._jitter_fraction,
+                self._jitter_fraction) * poller._poll_interval
+        if wait_seconds > 0:
+            self._local_clock.wait(wait_seconds, self._closed)
+            if self._closed.is_set() or not poller._enabled:
+                return
+        try:
+            poller._poll_once()
+        except Exception:
+            # Sensors raise during normal operation (e.g., the light sensor
+            # when it is dark), so a failed poll must not stop the other
+            # pollers that share this thread.
+            logger.exception('%s failed to poll', poller._name)
+        self._push(self._next_poll_time(poll_time, poller), poller)
+
+    def _reschedule_after_clock_step(self, now):
+        """Makes pollers stranded by a backward clock step due immediately.
+
+        Every scheduled poller that is due more than one poll interval from now
+        is rescheduled to poll now, so that no poller waits out the step.
+
+        Args:
+            now: The current time, after the clock step.
+        """
+        self._schedule = [(
+            now if (poll_time - now).total_seconds() > poller._poll_interval
+            else poll_time, sequence, poller)
+                          for poll_time, sequence, poller in self._schedule]
+        heapq.heapify(self._schedule)
+
+    def _next_poll_time(self, poll_time, poller):
+        """Calculates when a poller is next due to poll.
+
+        The next poll is scheduled relative to when the last poll was due
+        rather than when it finished, so that time spent polling does not
+        accumulate as drift. If polling overran one or more whole intervals,
+        the missed polls are skipped rather than run in a burst, and the next
+        poll stays in phase with the poller's original schedule.
+
+        Args:
+            poll_time: The time at which the poller's last poll was due.
+            poller: The poller to schedule.
+
+        Returns:
+            The time at which the poller is next due to poll.
+        """
+        next_poll_time = poll_time + datetime.timedelta(
+            seconds=poller._poll_interval)
+        overrun_seconds = (
+            self._local_clock.now() - next_poll_time).total_seconds()
+        if overrun_seconds > 0:
+            missed_polls = int(
+                math.ceil(overrun_seconds / poller._poll_interval))
+            logger.warning('%s fell behind schedule, skipping %d poll(s)',
+                           poller._name, missed_polls)
+            next_poll_time += datetime.timedelta(seconds=missed_polls *
+                                                 poller._poll_interval)
+        return next_poll_time
 
     def _poll_forever(self):
-        """Polls, forever, at a fixed interval."""
-        while True:
-            self._poll_once()
-            self._local_clock.wait(self._poll_interval)
+        """Polls each poller at its own interval until closed."""
+        # Log once for all pollers rather than once per poller.
+        if logger.isEnabledFor(logging.INFO):
+            logger.info('Polling started for %s',
+                        ', '.join(poller._name
+                                  for _, _, poller in sorted(self._schedule)))
+        while self._schedule and not self._closed.is_set():
+            self._poll_next()
+        logger.info('Polling stopped')
 
     def start_polling_async(self):
-        """Starts a new thread to begin polling."""
+        """Starts a new thread to begin polling all added pollers."""
         t = threading.Thread(target=self._poll_forever)
         t.setDaemon(True)
         t.start()
 
+    def close(self):
+        """Stops polling.
+
+        Interrupts any wait for the next poller, so polling stops without
+        waiting out the remainder of the current poll interval.
+        """
+        self._closed.set()
+
 
 class TemperaturePoller(SensorPollerBase):
     """Polls a temperature sensor and stores the readings."""
 
+    __slots__ = ('_read_temperature', '_record_queue')
+
     def __init__(self, local_clock, poll_interval, temperature_sensor,
-                 temperature_store):
+                 record_queue):
         """Creates a new TemperaturePoller object.
 
         Args:
@@ -40,24 +252,27 @@ class TemperaturePoller(SensorPollerBase):
             poll_interval: An int of how often the sensor should be polled, in
                 seconds.
             temperature_sensor: An interface for reading the temperature.
-            temperature_store: An interface for storing temperature readings.
+            record_queue: Queue on which to place temperature records for
+                storage.
         """
         super(TemperaturePoller, self).__init__(local_clock, poll_interval)
-        self._temperature_sensor = temperature_sensor
-        self._temperature_store = temperature_store
+        self._read_temperature = temperature_sensor.temperature
+        self._record_queue = record_queue
 
     def _poll_once(self):
         """Polls for and stores current ambient temperature."""
-        temperature = self._temperature_sensor.temperature()
-        self._temperature_store.store_temperature(self._local_clock.now(),
-                                                  temperature)
+        temperature = self._read_temperature()
+        _put_records(self._record_queue,
+                     (db_writer.TEMPERATURE, self._now(), temperature))
 
 
 class HumidityPoller(SensorPollerBase):
     """Polls a humidity sensor and stores the readings."""
 
+    __slots__ = ('_read_humidity', '_record_queue')
+
     def __init__(self, local_clock, poll_interval, humidity_sensor,
-                 humidity_store):
+                 record_queue):
         """Creates a new HumidityPoller object.
 
         Args:
@@ -65,48 +280,25 @@ class HumidityPoller(SensorPollerBase):
             poll_interval: An int of how often the sensor should be polled, in
                 seconds.
             humidity_sensor: An interface for reading the humidity.
-            humidity_store: An interface for storing humidity readings.
+            record_queue: Queue on which to place humidity records for storage.
         """
         super(HumidityPoller, self).__init__(local_clock, poll_interval)
-        self._humidity_sensor = humidity_sensor
-        self._humidity_store = humidity_store
+        self._read_humidity = humidity_sensor.humidity
+        self._record_queue = record_queue
 
     def _poll_once(self):
         """Polls for and stores current relative humidity."""
-        humidity = self._humidity_sensor.humidity()
-        self._humidity_store.store_humidity(self._local_clock.now(), humidity)
-
-
-class MoisturePoller(SensorPollerBase):
-    """Polls a moisture sensor and stores the readings."""
-
-    def __init__(self, local_clock, poll_interval, moisture_sensor,
-                 soil_moisture_store):
-        """Creates a MoisturePoller object.
-
-        Args:
-            local_clock: A local time zone clock interface.
-            poll_interval: An int of how often the sensor should be polled, in
-                seconds.
-            moisture_sensor: An interface for reading the moisture level.
-            soil_moisture_store: An interface for storing moisture readings.
-        """
-        super(MoisturePoller, self).__init__(local_clock, poll_interval)
-        self._moisture_sensor = moisture_sensor
-        self._soil_moisture_store = soil_moisture_store
-
-    def _poll_once(self):
-        """Polls current soil moisture."""
-        soil_moisture = self._moisture_sensor.moisture()
-        self._soil_moisture_store.store_soil_moisture(self._local_clock.now(),
-                                                      soil_moisture)
+        humidity = self._read_humidity()
+        _put_records(self._record_queue,
+                     (db_writer.HUMIDITY, self._now(), humidity))
 
 
 class AmbientLightPoller(SensorPollerBase):
     """Polls an ambient light sensor and stores the readings."""
 
-    def __init__(self, local_clock, poll_interval, light_sensor,
-                 ambient_light_store):
+    __slots__ = ('_read_ambient_light', '_record_queue')
+
+    def __init__(self, local_clock, poll_interval, light_sensor, record_queue):
         """Creates a new AmbientLightPoller object.
 
         Args:
@@ -114,24 +306,26 @@ class AmbientLightPoller(SensorPollerBase):
             poll_interval: An int of how often the sensor should be polled, in
                 seconds.
             light_sensor: An interface for reading the ambient light level.
-            ambient_light_store: An interface for storing ambient light
-                readings.
+            record_queue: Queue on which to place ambient light records for
+                storage.
         """
         super(AmbientLightPoller, self).__init__(local_clock, poll_interval)
-        self._light_sensor = light_sensor
-        self._ambient_light_store = ambient_light_store
+        self._read_ambient_light = light_sensor.ambient_light
+        self._record_queue = record_queue
 
     def _poll_once(self):
-        ambient_light = self._light_sensor.ambient_light()
-        self._ambient_light_store.store_ambient_light(self._local_clock.now(),
-                                                      ambient_light)
+        """Polls for and stores current ambient light level."""
+        ambient_light = self._read_ambient_light()
+        _put_records(self._record_queue,
+                     (db_writer.AMBIENT_LIGHT, self._now(), ambient_light))
 
 
 class ReservoirPoller(SensorPollerBase):
     """Polls for reservoir level data and stores the data."""
 
-    def __init__(self, local_clock, poll_interval, reservoir,
-                 reservoir_level_store):
+    __slots__ = ('_read_reservoir_level', '_record_queue')
+
+    def __init__(self, local_clock, poll_interval, reservoir, record_queue):
         """Creates a new ReservoirPoller object.
 
         Args:
@@ -139,61 +333,106 @@ class ReservoirPoller(SensorPollerBase):
             poll_interval: An int of how often the data should be polled for,
                 in seconds.
             reservoir: An object that returns a reservoir level.
-            reservoir_level_store: An interface for storing reservoir level
-                readings.
+            record_queue: Queue on which to place reservoir level records for
+                storage.
         """
         super(ReservoirPoller, self).__init__(local_clock, poll_interval)
-        self._reservoir = reservoir
-        self._reservoir_level_store = reservoir_level_store
+        self._read_reservoir_level = reservoir.reservoir_level
+        self._record_queue = record_queue
 
     def _poll_once(self):
         """Polls for and stores current reservoir level."""
-        reservoir_level = self._reservoir.reservoir_level()
-        self._reservoir_level_store.store_reservoir_level(
-            self._local_clock.now(), reservoir_level)
+        reservoir_level = self._read_reservoir_level()
+        _put_records(self._record_queue,
+                     (db_writer.RESERVOIR_LEVEL, self._now(), reservoir_level))
 
 
-class WateringEventPoller(SensorPollerBase):
-    """Polls for and records watering event data.
+class CompositeSensorPoller(SensorPollerBase):
+    """Polls several sensors together and stores their readings as one batch.
 
-    Polls for latest soil moisture readings and oversees a water pump based on
-    those readings.
+    All readings from a single poll share one timestamp.
     """
 
-    def __init__(self, local_clock, poll_interval, pump_manager,
-                 watering_event_store, soil_moisture_store):
-        """Creates a new WateringEventPoller object.
+    __slots__ = ('_tasks', '_record_queue')
+
+    def __init__(self, local_clock, poll_interval, tasks, record_queue):
+        """Creates a new CompositeSensorPoller object.
+
+        Args:
+            local_clock: A local time zone clock interface.
+            poll_interval: An int of how often the sensors should be polled, in
+                seconds.
+            tasks: A list of (read_func, kind) pairs, where read_func takes no
+                arguments and returns a sensor reading, and kind is the
+                db_writer record kind for that reading.
+            record_queue: Queue on which to place lists of records for
+                storage.
+        """
+        super(CompositeSensorPoller, self).__init__(local_clock, poll_interval)
+        self._tasks = list(tasks)
+        self._record_queue = record_queue
+
+    def _poll_once(self):
+        """Polls for and stores the current reading of each sensor."""
+        timestamp = self._now()
+        records = [(kind, timestamp, read_func())
+                   for read_func, kind in self._tasks]
+        _put_records(self._record_queue, records)
+
+
+class SoilWateringPoller(SensorPollerBase):
+    """Polls for and records soil moisture and watering event data.
+
+    Polls a soil moisture sensor and oversees a water pump based on the
+    moisture reading.
+    """
+
+    __slots__ = ('_read_moisture', '_pump_if_needed', '_record_queue')
+
+    def __init__(self, local_clock, poll_interval, moisture_sensor,
+                 pump_manager, record_queue):
+        """Creates a new SoilWateringPoller object.
 
         Args:
             local_clock: A local time zone clock interface.
             poll_interval: An int of how often the data should be polled for,
                 in seconds.
+            moisture_sensor: An interface for reading the soil moisture level.
             pump_manager: An interface to manage a water pump.
-            watering_event_store: An interface for storing watering event data.
-            soil_moisture_store: An interface for storing and retrieving soil
-                moisture readings.
+            record_queue: Queue on which to place lists of soil moisture
+                records and watering event records for storage.
         """
-        super(WateringEventPoller, self).__init__(local_clock, poll_interval)
-        self._pump_manager = pump_manager
-        self._watering_event_store = watering_event_store
-        self._soil_moisture_store = soil_moisture_store
+        super(SoilWateringPoller, self).__init__(local_clock, poll_interval)
+        self._read_moisture = moisture_sensor.moisture
+        self._pump_if_needed = pump_manager.pump_if_needed
+        self._record_queue = record_queue
 
     def _poll_once(self):
-        """Oversees a water pump, and polls for and stores watering event data.
+        """Polls soil moisture and oversees a water pump.
 
-        Polls for latest soil moisture readings and feeds them to a water pump.
-        If the pump runs, it stores the event data.
+        Polls the current soil moisture, stores it, and feeds it to a water
+        pump. If the pump runs, it stores the event data.
         """
-        soil_moisture = self._soil_moisture_store.latest_soil_moisture()
-        if soil_moisture is not None:
-            ml_pumped = self._pump_manager.pump_if_needed(soil_moisture)
-            if ml_pumped > 0:
-                self._watering_event_store.store_water_pumped(
-                    self._local_clock.now(), ml_pumped)
+        soil_moisture = self._read_moisture()
+        timestamp = self._now()
+        records = [(db_writer.SOIL_MOISTURE, timestamp, soil_moisture)]
+        ml_pumped = self._pump_if_needed(soil_moisture)
+        if ml_pumped > 0:
+            records.append((db_writer.WATERING_EVENT, timestamp, ml_pumped))
+        _put_records(self._record_queue, records)
 
 
 class CameraPoller(SensorPollerBase):
-    """Captures and stores pictures pictures from a camera."""
+    """Captures and stores pictures pictures from a camera.
+
+    Capturing and saving a photo can take seconds, so photos are saved on a
+    dedicated worker thread. Polling only requests a capture, which keeps slow
+    captures from delaying other pollers that share the scheduler thread. The
+    worker thread starts on the first poll, so a poller that is never polled
+    never starts a thread.
+    """
+
+    __slots__ = ('_camera_manager', '_capture_requests', '_worker')
 
     def __init__(self, local_clock, poll_interval, camera_manager):
         """Creates a new CameraPoller object.
@@ -206,7 +445,45 @@ class CameraPoller(SensorPollerBase):
         """
         super(CameraPoller, self).__init__(local_clock, poll_interval)
         self._camera_manager = camera_manager
+        self._capture_requests = Queue.Queue(
+            maxsize=_MAX_PENDING_CAPTURE_REQUESTS)
+        self._worker = None
+
+    def _save_photos(self):
+        """Saves a photo for each capture request until the poller closes."""
+        while True:
+            self._capture_requests.get()
+            if not self._enabled:
+                return
+            try:
+                self._camera_manager.save_photo()
+            except Exception:
+                logger.exception('Failed to save photo')
 
     def _poll_once(self):
-        """Captures and stores an image."""
-        self._camera_manager.save_photo()
\ No newline at end of file
+        """Requests that an image be captured and stored.
+
+        Starts the worker thread on the first poll. Drops the request if the
+        worker thread is already behind.
+        """
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._save_photos)
+            self._worker.setDaemon(True)
+            self._worker.start()
+        try:
+            self._capture_requests.put_nowait(None)
+        except Queue.Full:
+            logger.warning('Camera is still saving earlier photos, dropping '
+                           'capture request')
+
+    def close(self):
+        """Stops polling the camera and stops the worker thread."""
+        super(CameraPoller, self).close()
+        if self._worker is None:
+            return
+        try:
+            # Wake the worker so that it sees that the poller is closed. If the
+            # queue is full, the worker will see it after its current photo.
+            self._capture_requests.put_nowait(None)
+        except Queue.Full:
+            pass
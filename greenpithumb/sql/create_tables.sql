@@ -1,35 +1,35 @@
 CREATE TABLE temperature
 (
-    timestamp TEXT,
+    timestamp TIMESTAMP,
     temperature REAL    --ambient temperature (in degrees Celsius)
 );
 
 CREATE TABLE ambient_humidity
 (
-    timestamp TEXT,
+    timestamp TIMESTAMP,
     humidity REAL
 );
 
 CREATE TABLE soil_moisture
 (
-    timestamp TEXT,
+    timestamp TIMESTAMP,
     soil_moisture INTEGER
 );
 
 CREATE TABLE ambient_light
 (
-    timestamp TEXT,
+    timestamp TIMESTAMP,
     light REAL
 );
 
 CREATE TABLE reservoir_level
 (
-    timestamp TEXT,
+    timestamp TIMESTAMP,
     level REAL  -- reservoir level (in mL)
 );
 
 CREATE TABLE watering_events
 (
-    timestamp TEXT,
+    timestamp TIMESTAMP,
     water_pumped REAL   --amount of water pumped (in mL)
-);
\ No newline at end of file
+);
@@ -1,3 +1,4 @@
+import threading
 import time
 import unittest
 
@@ -22,6 +23,20 @@ class ClockTest(unittest.TestCase):
         self.clock.wait(0.0)
         mock_sleep.assert_called_once_with(0.0)
 
+    @mock.patch.object(time, 'sleep')
+    def test_wait_with_interrupt_event_waits_on_event(self, mock_sleep):
+        mock_interrupt_event = mock.Mock()
+        self.clock.wait(5.0, mock_interrupt_event)
+        mock_interrupt_event.wait.assert_called_once_with(5.0)
+        self.assertFalse(mock_sleep.called)
+
+    def test_wait_ends_when_interrupt_event_is_set(self):
+        interrupt_event = threading.Event()
+        interrupt_event.set()
+        start_time = time.time()
+        self.clock.wait(30.0, interrupt_event)
+        self.assertLess(time.time() - start_time, 5.0)
+
     def test_negative_numbers_raise_ValueError(self):
         """Waiting a negative time is invalid and should raise an exception."""
         with self.assertRaises(ValueError):
@@ -1,5 +1,9 @@
 import unittest
 import datetime
+import os
+import shutil
+import sqlite3
+import tempfile
 
 import mock
 from dateutil import tz
@@ -11,6 +15,151 @@ from greenpithumb import db_store
 UTC_MINUS_5 = tz.tzoffset(None, -18000)
 
 
+class OpenOrCreateDbTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'greenpithumb.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_creates_tables_in_new_database(self):
+        connection = db_store.open_or_create_db(self.db_path)
+        table_names = [
+            row[0]
+            for row in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type='table'")
+        ]
+        connection.close()
+        self.assertItemsEqual([
+            'temperature', 'ambient_humidity', 'soil_moisture', 'ambient_light',
+            'reservoir_level', 'watering_events'
+        ], table_names)
+
+    def test_creates_timestamp_indexes_in_new_database(self):
+        connection = db_store.open_or_create_db(self.db_path)
+        indexed_tables = [
+            row[0]
+            for row in connection.execute(
+                "SELECT tbl_name FROM sqlite_master WHERE type='index'")
+        ]
+        connection.close()
+        self.assertItemsEqual([
+            'temperature', 'ambient_humidity', 'soil_moisture', 'ambient_light',
+            'reservoir_level', 'watering_events'
+        ], indexed_tables)
+
+    def test_creates_new_database_in_wal_mode(self):
+        connection = db_store.open_or_create_db(self.db_path)
+        journal_mode = connection.execute('PRAGMA journal_mode').fetchone()[0]
+        synchronous = connection.execute('PRAGMA synchronous').fetchone()[0]
+        mmap_size = connection.execute('PRAGMA mmap_size').fetchone()[0]
+        connection.close()
+        self.assertEqual('wal', journal_mode)
+        # 1 is the value SQLite reports for synchronous=NORMAL.
+        self.assertEqual(1, synchronous)
+        self.assertEqual(64 * 1024 * 1024, mmap_size)
+
+    def test_failed_creation_removes_database_file(self):
+        bad_script_path = os.path.join(self.temp_dir, 'bad.sql')
+        with open(bad_script_path, 'w') as bad_script:
+            bad_script.write('CREATE TABLE broken (;')
+        with mock.patch.object(db_store, '_CREATE_TABLES_SCRIPT_PATH',
+                               bad_script_path):
+            with self.assertRaises(sqlite3.OperationalError):
+                db_store.open_or_create_db(self.db_path)
+        self.assertFalse(os.path.exists(self.db_path))
+
+    def test_stores_timestamps_in_iso_8601_format(self):
+        connection = db_store.open_or_create_db(self.db_path)
+        store = db_store.TemperatureStore(connection.cursor())
+        store.store_temperature(
+            datetime.datetime(
+                2016, 7, 23, 10, 51, 9, 928000, tzinfo=pytz.utc),
+            21.0)
+        # Cast the timestamp so that sqlite3 returns the stored string rather
+        # than converting it to a datetime.
+        rows = connection.execute(
+            'SELECT CAST(timestamp AS TEXT), temperature FROM temperature'
+        ).fetchall()
+        connection.close()
+        self.assertEqual([('2016-07-23T10:51:09.928000+00:00', 21.0)], rows)
+
+    def test_retrieves_stored_timestamps(self):
+        timestamp = datetime.datetime(
+            2016, 7, 23, 10, 51, 9, 928000, tzinfo=UTC_MINUS_5)
+        connection = db_store.open_or_create_db(self.db_path)
+        store = db_store.TemperatureStore(connection.cursor())
+        store.store_temperature(timestamp, 21.0)
+        temperature_data = store.retrieve_temperature()
+        connection.close()
+        self.assertEqual([db_store.TemperatureRecord(timestamp, 21.0)],
+                         temperature_data)
+
+    def test_retrieves_timestamps_from_text_columns(self):
+        legacy_connection = sqlite3.connect(self.db_path)
+        legacy_connection.execute(
+            'CREATE TABLE temperature (timestamp TEXT, temperature REAL)')
+        legacy_connection.execute("INSERT INTO temperature VALUES "
+                                  "('2016-07-23T10:51:09.928000-05:00', 21.0)")
+        legacy_connection.commit()
+        legacy_connection.close()
+
+        connection = db_store.open_or_create_db(self.db_path)
+        store = db_store.TemperatureStore(connection.cursor())
+        temperature_data = store.retrieve_temperature()
+        connection.close()
+        self.assertEqual(
+            [
+                db_store.TemperatureRecord(
+                    datetime.datetime(
+                        2016, 7, 23, 10, 51, 9, 928000, tzinfo=UTC_MINUS_5),
+                    21.0)
+            ],
+            temperature_data)
+
+    def test_creates_timestamp_indexes_in_existing_database(self):
+        legacy_connection = sqlite3.connect(self.db_path)
+        legacy_connection.execute(
+            'CREATE TABLE temperature (timestamp TEXT, temperature REAL)')
+        legacy_connection.commit()
+        legacy_connection.close()
+
+        connection = db_store.open_or_create_db(self.db_path)
+        index_names = [
+            row[0]
+            for row in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type='index'")
+        ]
+        connection.close()
+        self.assertEqual(['temperature_timestamp_index'], index_names)
+
+    def test_opens_existing_database_in_wal_mode(self):
+        db_store.open_or_create_db(self.db_path).close()
+        connection = db_store.open_or_create_db(self.db_path)
+        journal_mode = connection.execute('PRAGMA journal_mode').fetchone()[0]
+        synchronous = connection.execute('PRAGMA synchronous').fetchone()[0]
+        connection.close()
+        self.assertEqual('wal', journal_mode)
+        # 1 is the value SQLite reports for synchronous=NORMAL.
+        self.assertEqual(1, synchronous)
+
+
+class ParseTimestampTest(unittest.TestCase):
+
+    def test_python_parser_matches_serialized_format(self):
+        self.assertEqual(
+            datetime.datetime(
+                2016, 7, 23, 10, 51, 9, 928000, tzinfo=UTC_MINUS_5),
+            db_store._parse_iso8601_timestamp_python(
+                '2016-07-23T10:51:09.928000-05:00'))
+
+    def test_python_parser_rejects_other_formats(self):
+        self.assertIsNone(
+            db_store._parse_iso8601_timestamp_python('July 23, 2016 10:51:09'))
+
+
 class StoreClassesTest(unittest.TestCase):
 
     def test_store_soil_moisture(self):
@@ -22,8 +171,8 @@ class StoreClassesTest(unittest.TestCase):
         store = db_store.SoilMoistureStore(mock_cursor)
         store.store_soil_moisture(timestamp, soil_moisture)
         mock_cursor.execute.assert_called_once_with(
-            "INSERT INTO soil_moisture VALUES (?, ?)", (
-                '2016-07-23T10:51:09.928000+00:00', soil_moisture))
+            "INSERT INTO soil_moisture VALUES (?, ?)",
+            (timestamp, soil_moisture))
 
     def test_latest_soil_moisture(self):
         mock_cursor = mock.Mock()
@@ -40,12 +189,11 @@ class StoreClassesTest(unittest.TestCase):
         self.assertIsNone(moisture)
 
     def test_retrieve_soil_moisture(self):
-        mock_cursor = mock.Mock()
+        mock_cursor = mock.MagicMock()
         store = db_store.SoilMoistureStore(mock_cursor)
-        mock_cursor.fetchall.return_value = [
-            ('2016-07-23 10:51:09.928000-05:00', 300),
-            ('2016-07-23 10:52:09.928000-05:00', 400)
-        ]
+        mock_cursor.__iter__.return_value = iter(
+            [('2016-07-23 10:51:09.928000-05:00', 300),
+             ('2016-07-23 10:52:09.928000-05:00', 400)])
         soil_moisture_data = store.retrieve_soil_moisture()
         soil_moisture_data.sort(
             key=lambda SoilMoistureRecord: SoilMoistureRecord.timestamp)
@@ -62,9 +210,9 @@ class StoreClassesTest(unittest.TestCase):
         self.assertEqual(soil_moisture_data[1].soil_moisture, 400)
 
     def test_retrieve_soil_moisture_empty_database(self):
-        mock_cursor = mock.Mock()
+        mock_cursor = mock.MagicMock()
         store = db_store.SoilMoistureStore(mock_cursor)
-        mock_cursor.fetchall.return_value = []
+        mock_cursor.__iter__.return_value = iter([])
         soil_moisture_data = store.retrieve_soil_moisture()
         self.assertEqual(soil_moisture_data, [])
 
@@ -77,16 +225,15 @@ class StoreClassesTest(unittest.TestCase):
         store = db_store.AmbientLightStore(mock_cursor)
         store.store_ambient_light(timestamp, ambient_light)
         mock_cursor.execute.assert_called_once_with(
-            "INSERT INTO ambient_light VALUES (?, ?)", (
-                '2016-07-23T10:51:09.928000+00:00', ambient_light))
+            "INSERT INTO ambient_light VALUES (?, ?)",
+            (timestamp, ambient_light))
 
     def test_retrieve_ambient_light(self):
-        mock_cursor = mock.Mock()
+        mock_cursor = mock.MagicMock()
         store = db_store.AmbientLightStore(mock_cursor)
-        mock_cursor.fetchall.return_value = [
-            ('2016-07-23 10:51:09.928000-05:00', 300),
-            ('2016-07-23 10:52:09.928000-05:00', 400)
-        ]
+        mock_cursor.__iter__.return_value = iter(
+            [('2016-07-23 10:51:09.928000-05:00', 300),
+             ('2016-07-23 10:52:09.928000-05:00', 400)])
         ambient_light_data = store.retrieve_ambient_light()
         ambient_light_data.sort(
             key=lambda AmbientLightRecord: AmbientLightRecord.timestamp)
@@ -103,9 +250,9 @@ class StoreClassesTest(unittest.TestCase):
         self.assertEqual(ambient_light_data[1].ambient_light, 400)
 
     def test_retrieve_ambient_light_empty_database(self):
-        mock_cursor = mock.Mock()
+        mock_cursor = mock.MagicMock()
         store = db_store.AmbientLightStore(mock_cursor)
-        mock_cursor.fetchall.return_value = []
+        mock_cursor.__iter__.return_value = iter([])
         ambient_light_data = store.retrieve_ambient_light()
         self.assertEqual(ambient_light_data, [])
 
@@ -118,16 +265,14 @@ class StoreClassesTest(unittest.TestCase):
         store = db_store.HumidityStore(mock_cursor)
         store.store_humidity(timestamp, humidity)
         mock_cursor.execute.assert_called_once_with(
-            "INSERT INTO ambient_humidity VALUES (?, ?)",
-            ('2016-07-23T10:51:09.928000+00:00', humidity))
+            "INSERT INTO ambient_humidity VALUES (?, ?)", (timestamp, humidity))
 
     def test_retrieve_humidity(self):
-        mock_cursor = mock.Mock()
+        mock_cursor = mock.MagicMock()
         store = db_store.HumidityStore(mock_cursor)
-        mock_cursor.fetchall.return_value = [
-            ('2016-07-23 10:51:09.928000-05:00', 50),
-            ('2016-07-23 10:52:09.928000-05:00', 51)
-        ]
+        mock_cursor.__iter__.return_value = iter(
+            [('2016-07-23 10:51:09.928000-05:00', 50),
+             ('2016-07-23 10:52:09.928000-05:00', 51)])
         humidity_data = store.retrieve_humidity()
         humidity_data.sort(key=lambda HumidityRecord: HumidityRecord.timestamp)
 
@@ -143,9 +288,9 @@ class StoreClassesTest(unittest.TestCase):
         self.assertEqual(humidity_data[1].humidity, 51)
 
     def test_retrieve_humidity_empty_database(self):
-        mock_cursor = mock.Mock()
+        mock_cursor = mock.MagicMock()
         store = db_store.HumidityStore(mock_cursor)
-        mock_cursor.fetchall.return_value = []
+        mock_cursor.__iter__.return_value = iter([])
         humidity_data = store.retrieve_humidity()
         self.assertEqual(humidity_data, [])
 
@@ -158,16 +303,15 @@ class StoreClassesTest(unittest.TestCase):
         store = db_store.ReservoirLevelStore(mock_cursor)
         store.store_reservoir_level(timestamp, reservoir_level)
         mock_cursor.execute.assert_called_once_with(
-            "INSERT INTO reservoir_level VALUES (?, ?)", (
-                '2016-07-23T10:51:09.928000+00:00', reservoir_level))
+            "INSERT INTO reservoir_level VALUES (?, ?)",
+            (timestamp, reservoir_level))
 
     def test_retrieve_reservoir_level(self):
-        mock_cursor = mock.Mock()
+        mock_cursor = mock.MagicMock()
         store = db_store.ReservoirLevelStore(mock_cursor)
-        mock_cursor.fetchall.return_value = [
-            ('2016-07-23 10:51:09.928000-05:00', 1000),
-            ('2016-07-23 10:52:09.928000-05:00', 1200)
-        ]
+        mock_cursor.__iter__.return_value = iter(
+            [('2016-07-23 10:51:09.928000-05:00', 1000),
+             ('2016-07-23 10:52:09.928000-05:00', 1200)])
         reservoir_level_data = store.retrieve_reservoir_level()
         reservoir_level_data.sort(
             key=lambda ReservoirLevelRecord: ReservoirLevelRecord.timestamp)
@@ -184,12 +328,23 @@ class StoreClassesTest(unittest.TestCase):
         self.assertEqual(reservoir_level_data[1].reservoir_level, 1200)
 
     def test_retrieve_reservoir_level_empty_database(self):
-        mock_cursor = mock.Mock()
+        mock_cursor = mock.MagicMock()
         store = db_store.ReservoirLevelStore(mock_cursor)
-        mock_cursor.fetchall.return_value = []
+        mock_cursor.__iter__.return_value = iter([])
         reservoir_level_data = store.retrieve_reservoir_level()
         self.assertEqual(reservoir_level_data, [])
 
+    def test_store_many(self):
+        """Should insert all readings with a single statement."""
+        timestamp = datetime.datetime(
+            2016, 7, 23, 10, 51, 9, 928000, tzinfo=pytz.utc)
+        readings = [(timestamp, 21.1), (timestamp, 21.2)]
+        mock_cursor = mock.Mock()
+        store = db_store.TemperatureStore(mock_cursor)
+        store.store_many(readings)
+        mock_cursor.executemany.assert_called_once_with(
+            "INSERT INTO temperature VALUES (?, ?)", readings)
+
     def test_store_temperature(self):
         """Should insert timestamp and temperature into database."""
         timestamp = datetime.datetime(
@@ -199,16 +354,14 @@ class StoreClassesTest(unittest.TestCase):
         store = db_store.TemperatureStore(mock_cursor)
         store.store_temperature(timestamp, temperature)
         mock_cursor.execute.assert_called_once_with(
-            "INSERT INTO temperature VALUES (?, ?)",
-            ('2016-07-23T10:51:09.928000+00:00', temperature))
+            "INSERT INTO temperature VALUES (?, ?)", (timestamp, temperature))
 
     def test_retrieve_temperature(self):
-        mock_cursor = mock.Mock()
+        mock_cursor = mock.MagicMock()
         store = db_store.TemperatureStore(mock_cursor)
-        mock_cursor.fetchall.return_value = [
-            ('2016-07-23 10:51:09.928000-05:00', 21.0),
-            ('2016-07-23 10:52:09.928000-05:00', 21.5)
-        ]
+        mock_cursor.__iter__.return_value = iter(
+            [('2016-07-23 10:51:09.928000-05:00', 21.0),
+             ('2016-07-23 10:52:09.928000-05:00', 21.5)])
         temperature_data = store.retrieve_temperature()
         temperature_data.sort(
             key=lambda TemperatureRecord: TemperatureRecord.timestamp)
@@ -217,6 +370,7 @@ class StoreClassesTest(unittest.TestCase):
             temperature_data[0].timestamp,
             datetime.datetime(
                 2016, 7, 23, 10, 51, 9, 928000, tzinfo=UTC_MINUS_5))
+        self.assertIsInstance(temperature_data[0], db_store.TemperatureRecord)
         self.assertEqual(temperature_data[0].temperature, 21.0)
         self.assertEqual(
             temperature_data[1].timestamp,
@@ -224,10 +378,55 @@ class StoreClassesTest(unittest.TestCase):
                 2016, 7, 23, 10, 52, 9, 928000, tzinfo=UTC_MINUS_5))
         self.assertEqual(temperature_data[1].temperature, 21.5)
 
+    def test_retrieve_temperature_serialized_timestamps(self):
+        mock_cursor = mock.MagicMock()
+        store = db_store.TemperatureStore(mock_cursor)
+        mock_cursor.__iter__.return_value = iter([
+            ('2016-07-23T10:51:09.928000+00:00', 21.0),
+            ('2016-07-23T10:52:09-05:00', 21.5),
+        ])
+        temperature_data = store.retrieve_temperature()
+        temperature_data.sort(
+            key=lambda TemperatureRecord: TemperatureRecord.timestamp)
+
+        self.assertEqual(
+            temperature_data[0].timestamp,
+            datetime.datetime(
+                2016, 7, 23, 10, 51, 9, 928000, tzinfo=pytz.utc))
+        self.assertEqual(
+            temperature_data[1].timestamp,
+            datetime.datetime(
+                2016, 7, 23, 10, 52, 9, tzinfo=UTC_MINUS_5))
+
+    def test_retrieve_temperature_non_iso_timestamp(self):
+        mock_cursor = mock.MagicMock()
+        store = db_store.TemperatureStore(mock_cursor)
+        mock_cursor.__iter__.return_value = iter(
+            [('July 23, 2016 10:51:09', 21.0)])
+        temperature_data = store.retrieve_temperature()
+
+        self.assertEqual(temperature_data[0].timestamp,
+                         datetime.datetime(2016, 7, 23, 10, 51, 9))
+
+    def test_retrieve_temperature_parses_repeated_timestamp_once(self):
+        mock_cursor = mock.MagicMock()
+        store = db_store.TemperatureStore(mock_cursor)
+        mock_cursor.__iter__.return_value = iter([
+            ('2016-07-23T10:51:09.928000+00:00', 21.0),
+            ('2016-07-23T10:51:09.928000+00:00', 21.5),
+        ])
+        with mock.patch.object(
+                db_store, '_parse_timestamp',
+                wraps=db_store._parse_timestamp) as mock_parse:
+            temperature_data = store.retrieve_temperature()
+        mock_parse.assert_called_once_with('2016-07-23T10:51:09.928000+00:00')
+        self.assertEqual(temperature_data[0].timestamp,
+                         temperature_data[1].timestamp)
+
     def test_retrieve_temperature_empty_database(self):
-        mock_cursor = mock.Mock()
+        mock_cursor = mock.MagicMock()
         store = db_store.TemperatureStore(mock_cursor)
-        mock_cursor.fetchall.return_value = []
+        mock_cursor.__iter__.return_value = iter([])
         temperature_data = store.retrieve_temperature()
         self.assertEqual(temperature_data, [])
 
@@ -240,16 +439,15 @@ class StoreClassesTest(unittest.TestCase):
         store = db_store.WateringEventStore(mock_cursor)
         store.store_water_pumped(timestamp, water_pumped)
         mock_cursor.execute.assert_called_once_with(
-            "INSERT INTO watering_events VALUES (?, ?)", (
-                '2016-07-23T10:51:09.928000+00:00', water_pumped))
+            "INSERT INTO watering_events VALUES (?, ?)",
+            (timestamp, water_pumped))
 
     def test_retrieve_water_pumped(self):
-        mock_cursor = mock.Mock()
+        mock_cursor = mock.MagicMock()
         store = db_store.WateringEventStore(mock_cursor)
-        mock_cursor.fetchall.return_value = [
-            ('2016-07-23 10:51:09.928000-05:00', 300),
-            ('2016-07-23 10:52:09.928000-05:00', 301)
-        ]
+        mock_cursor.__iter__.return_value = iter(
+            [('2016-07-23 10:51:09.928000-05:00', 300),
+             ('2016-07-23 10:52:09.928000-05:00', 301)])
         watering_event_data = store.retrieve_water_pumped()
         watering_event_data.sort(
             key=lambda WaterintEventRecord: WaterintEventRecord.timestamp)
@@ -266,8 +464,8 @@ class StoreClassesTest(unittest.TestCase):
         self.assertEqual(watering_event_data[1].water_pumped, 301)
 
     def test_retrieve_water_pumped_empty_database(self):
-        mock_cursor = mock.Mock()
+        mock_cursor = mock.MagicMock()
         store = db_store.WateringEventStore(mock_cursor)
-        mock_cursor.fetchall.return_value = []
+        mock_cursor.__iter__.return_value = iter([])
         watering_event_data = store.retrieve_water_pumped()
         self.assertEqual(watering_event_data, [])
@@ -0,0 +1,129 @@
+import datetime
+import Queue
+import sqlite3
+import unittest
+
+import mock
+import pytz
+
+from greenpithumb import db_writer
+
+TIMESTAMP_A = datetime.datetime(2016, 7, 23, 10, 51, 9, 928000, tzinfo=pytz.utc)
+TIMESTAMP_B = datetime.datetime(2016, 7, 23, 10, 52, 9, 928000, tzinfo=pytz.utc)
+
+
+class CreateRecordQueueTest(unittest.TestCase):
+
+    def test_record_queue_is_bounded(self):
+        record_queue = db_writer.create_record_queue(maxsize=1)
+        record_queue.put((db_writer.TEMPERATURE, TIMESTAMP_A, 21.0))
+        with self.assertRaises(Queue.Full):
+            record_queue.put_nowait((db_writer.TEMPERATURE, TIMESTAMP_A, 22.0))
+
+
+class DbWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mock_connection = mock.Mock()
+        self.mock_cursor = self.mock_connection.cursor.return_value
+        self.record_queue = Queue.Queue()
+        self.writer = db_writer.DbWriter(self.mock_connection,
+                                         self.record_queue)
+
+    def test_writes_batch_in_single_transaction(self):
+        self.record_queue.put((db_writer.TEMPERATURE, TIMESTAMP_A, 21.0))
+        self.record_queue.put((db_writer.SOIL_MOISTURE, TIMESTAMP_A, 300))
+        self.writer._write_batch()
+        self.mock_cursor.executemany.assert_has_calls(
+            [
+                mock.call('INSERT INTO temperature VALUES (?, ?)',
+                          [(TIMESTAMP_A, 21.0)]),
+                mock.call('INSERT INTO soil_moisture VALUES (?, ?)',
+                          [(TIMESTAMP_A, 300)])
+            ],
+            any_order=True)
+        self.mock_connection.commit.assert_called_once_with()
+        self.assertTrue(self.record_queue.empty())
+
+    def test_groups_records_of_same_kind(self):
+        self.record_queue.put((db_writer.HUMIDITY, TIMESTAMP_A, 50.0))
+        self.record_queue.put((db_writer.HUMIDITY, TIMESTAMP_B, 51.0))
+        self.writer._write_batch()
+        self.mock_cursor.executemany.assert_called_once_with(
+            'INSERT INTO ambient_humidity VALUES (?, ?)', [(TIMESTAMP_A, 50.0),
+                                                           (TIMESTAMP_B, 51.0)])
+
+    def test_stops_when_batch_is_full(self):
+        for _ in range(db_writer._MAX_BATCH_SIZE + 1):
+            self.record_queue.put((db_writer.HUMIDITY, TIMESTAMP_A, 50.0))
+        self.writer._write_batch()
+        _, rows = self.mock_cursor.executemany.call_args[0]
+        self.assertEqual(db_writer._MAX_BATCH_SIZE, len(rows))
+        self.assertEqual(1, self.record_queue.qsize())
+        self.mock_connection.commit.assert_called_once_with()
+
+    def test_writes_each_record_type(self):
+        self.record_queue.put((db_writer.AMBIENT_LIGHT, TIMESTAMP_A, 50.0))
+        self.record_queue.put((db_writer.RESERVOIR_LEVEL, TIMESTAMP_A, 1000.0))
+        self.record_queue.put((db_writer.WATERING_EVENT, TIMESTAMP_A, 200.0))
+        self.writer._write_batch()
+        self.mock_cursor.executemany.assert_has_calls(
+            [
+                mock.call('INSERT INTO ambient_light VALUES (?, ?)',
+                          [(TIMESTAMP_A, 50.0)]),
+                mock.call('INSERT INTO reservoir_level VALUES (?, ?)',
+                          [(TIMESTAMP_A, 1000.0)]),
+                mock.call('INSERT INTO watering_events VALUES (?, ?)',
+                          [(TIMESTAMP_A, 200.0)])
+            ],
+            any_order=True)
+
+    def test_writes_list_of_records(self):
+        self.record_queue.put([(db_writer.SOIL_MOISTURE, TIMESTAMP_A, 100),
+                               (db_writer.WATERING_EVENT, TIMESTAMP_A, 200.0)])
+        self.writer._write_batch()
+        self.mock_cursor.executemany.assert_has_calls(
+            [
+                mock.call('INSERT INTO soil_moisture VALUES (?, ?)',
+                          [(TIMESTAMP_A, 100)]),
+                mock.call('INSERT INTO watering_events VALUES (?, ?)',
+                          [(TIMESTAMP_A, 200.0)])
+            ],
+            any_order=True)
+        self.mock_connection.commit.assert_called_once_with()
+
+    @mock.patch.object(db_writer, 'logger')
+    def test_skips_unsupported_record(self, mock_logger):
+        self.record_queue.put(('dummy_kind', TIMESTAMP_A, 21.0))
+        self.record_queue.put((db_writer.TEMPERATURE, TIMESTAMP_A, 21.0))
+        self.writer._write_batch()
+        self.mock_cursor.executemany.assert_called_once_with(
+            'INSERT INTO temperature VALUES (?, ?)', [(TIMESTAMP_A, 21.0)])
+        self.mock_connection.commit.assert_called_once_with()
+        self.assertTrue(mock_logger.error.called)
+
+    @mock.patch.object(db_writer, 'logger')
+    def test_rolls_back_batch_on_database_error(self, mock_logger):
+        self.mock_cursor.executemany.side_effect = sqlite3.OperationalError(
+            'database is locked')
+        self.record_queue.put((db_writer.TEMPERATURE, TIMESTAMP_A, 21.0))
+        self.writer._write_batch()
+        self.assertFalse(self.mock_connection.commit.called)
+        self.mock_connection.rollback.assert_called_once_with()
+        self.assertTrue(mock_logger.exception.called)
+
+        self.mock_cursor.executemany.side_effect = None
+        self.record_queue.put((db_writer.TEMPERATURE, TIMESTAMP_B, 22.0))
+        self.writer._write_batch()
+        self.mock_cursor.executemany.assert_called_with(
+            'INSERT INTO temperature VALUES (?, ?)', [(TIMESTAMP_B, 22.0)])
+        self.mock_connection.commit.assert_called_once_with()
+
+    @mock.patch.object(db_writer, 'logger')
+    def test_keeps_writing_after_unexpected_error(self, mock_logger):
+        self.writer._write_batch = mock.Mock(
+            side_effect=[ValueError('dummy error'), None, SystemExit()])
+        with self.assertRaises(SystemExit):
+            self.writer._write_forever()
+        self.assertEqual(3, self.writer._write_batch.call_count)
+        self.assertTrue(mock_logger.exception.called)
@@ -2,6 +2,7 @@ import unittest
 
 import mock
 import datetime
+import pytz
 
 from greenpithumb import dht11
 
@@ -69,3 +70,17 @@ class CachingDHT11Test(unittest.TestCase):
         caching_dht11.humidity()
         caching_dht11.temperature()
         self.assertEqual(2, self.mock_dht11_read_func.call_count)
+
+    def test_reads_once_with_timezone_aware_clock(self):
+        caching_dht11 = dht11.CachingDHT11(self.mock_dht11_read_func,
+                                           self.mock_clock)
+        self.mock_dht11_read_func.return_value = (50.0, 21.0)
+        self.mock_clock.now.return_value = (datetime.datetime(
+            2016, 1, 1, 0, 0, 0, 0, tzinfo=pytz.utc))
+
+        humidity = caching_dht11.humidity()
+        temperature = caching_dht11.temperature()
+
+        self.assertEqual(humidity, 50.0)
+        self.assertEqual(temperature, 21.0)
+        self.assertEqual(1, self.mock_dht11_read_func.call_count)
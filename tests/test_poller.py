@@ -2,164 +2,508 @@ import unittest
 
 import mock
 import datetime
+import Queue
 import threading
 
+from greenpithumb import db_writer
 from greenpithumb import poller
 
 TEST_TIMEOUT_SECONDS = 3.0
 TIMESTAMP_A = datetime.datetime(2016, 7, 23, 10, 51, 9, 928000)
+TIMESTAMP_B = datetime.datetime(2016, 7, 23, 10, 51, 10, 12000)
 POLL_INTERVAL = 1
 
 
+def _run_scheduler(test_case, scheduler):
+    """Runs a scheduler on a background thread until the test ends.
+
+    Waits for the thread to exit at the end of the test so that it does not
+    outlive the test run.
+    """
+    t = threading.Thread(target=scheduler._poll_forever)
+    t.setDaemon(True)
+    t.start()
+    test_case.addCleanup(t.join, TEST_TIMEOUT_SECONDS)
+    test_case.addCleanup(scheduler.close)
+
+
+def _start_polling(test_case, local_clock, sensor_poller):
+    """Polls a single poller on its own scheduler until the test ends."""
+    scheduler = poller.PollerScheduler(local_clock)
+    scheduler.add(sensor_poller)
+    _run_scheduler(test_case, scheduler)
+
+
 class PollerClassesTest(unittest.TestCase):
 
     def setUp(self):
         self.clock_wait_event = threading.Event()
         self.mock_local_clock = mock.Mock()
         self.mock_sensor = mock.Mock()
-        self.mock_store = mock.Mock()
+        self.mock_record_queue = mock.Mock()
 
     def test_temperature_poller(self):
         temperature_poller = poller.TemperaturePoller(
             self.mock_local_clock, POLL_INTERVAL, self.mock_sensor,
-            self.mock_store)
+            self.mock_record_queue)
         self.mock_local_clock.now.return_value = TIMESTAMP_A
         self.mock_local_clock.wait.side_effect = (
-            lambda _: self.clock_wait_event.set())
+            lambda *_: self.clock_wait_event.set())
         self.mock_sensor.temperature.return_value = 21.0
 
-        temperature_poller.start_polling_async()
+        _start_polling(self, self.mock_local_clock, temperature_poller)
         self.clock_wait_event.wait(TEST_TIMEOUT_SECONDS)
-        self.mock_store.store_temperature.assert_called_with(TIMESTAMP_A, 21.0)
-        self.mock_local_clock.wait.assert_called_with(POLL_INTERVAL)
+        self.mock_record_queue.put_nowait.assert_called_with(
+            (db_writer.TEMPERATURE, TIMESTAMP_A, 21.0))
+        self.mock_local_clock.wait.assert_any_call(POLL_INTERVAL, mock.ANY)
 
     def test_humidity_poller(self):
         humidity_poller = poller.HumidityPoller(self.mock_local_clock,
                                                 POLL_INTERVAL, self.mock_sensor,
-                                                self.mock_store)
+                                                self.mock_record_queue)
         self.mock_local_clock.now.return_value = TIMESTAMP_A
         self.mock_local_clock.wait.side_effect = (
-            lambda _: self.clock_wait_event.set())
+            lambda *_: self.clock_wait_event.set())
         self.mock_sensor.humidity.return_value = 50.0
 
-        humidity_poller.start_polling_async()
-        self.clock_wait_event.wait(TEST_TIMEOUT_SECONDS)
-        self.mock_store.store_humidity.assert_called_with(TIMESTAMP_A, 50.0)
-        self.mock_local_clock.wait.assert_called_with(POLL_INTERVAL)
-
-    def test_moisture_poller(self):
-        moisture_poller = poller.MoisturePoller(self.mock_local_clock,
-                                                POLL_INTERVAL, self.mock_sensor,
-                                                self.mock_store)
-        self.mock_local_clock.now.return_value = TIMESTAMP_A
-        self.mock_local_clock.wait.side_effect = (
-            lambda _: self.clock_wait_event.set())
-        self.mock_sensor.moisture.return_value = 300
-
-        moisture_poller.start_polling_async()
+        _start_polling(self, self.mock_local_clock, humidity_poller)
         self.clock_wait_event.wait(TEST_TIMEOUT_SECONDS)
-        self.mock_store.store_soil_moisture.assert_called_with(TIMESTAMP_A, 300)
-        self.mock_local_clock.wait.assert_called_with(POLL_INTERVAL)
+        self.mock_record_queue.put_nowait.assert_called_with(
+            (db_writer.HUMIDITY, TIMESTAMP_A, 50.0))
+        self.mock_local_clock.wait.assert_any_call(POLL_INTERVAL, mock.ANY)
 
     def test_ambient_light_poller(self):
         ambient_light_poller = poller.AmbientLightPoller(
             self.mock_local_clock, POLL_INTERVAL, self.mock_sensor,
-            self.mock_store)
+            self.mock_record_queue)
         self.mock_local_clock.now.return_value = TIMESTAMP_A
         self.mock_local_clock.wait.side_effect = (
-            lambda _: self.clock_wait_event.set())
+            lambda *_: self.clock_wait_event.set())
         self.mock_sensor.ambient_light.return_value = 50.0
 
-        ambient_light_poller.start_polling_async()
+        _start_polling(self, self.mock_local_clock, ambient_light_poller)
         self.clock_wait_event.wait(TEST_TIMEOUT_SECONDS)
-        self.mock_store.store_ambient_light.assert_called_with(TIMESTAMP_A,
-                                                               50.0)
-        self.mock_local_clock.wait.assert_called_with(POLL_INTERVAL)
+        self.mock_record_queue.put_nowait.assert_called_with(
+            (db_writer.AMBIENT_LIGHT, TIMESTAMP_A, 50.0))
+        self.mock_local_clock.wait.assert_any_call(POLL_INTERVAL, mock.ANY)
 
     def test_reservoir_poller(self):
         reservoir_poller = poller.ReservoirPoller(
             self.mock_local_clock, POLL_INTERVAL, self.mock_sensor,
-            self.mock_store)
+            self.mock_record_queue)
         self.mock_local_clock.now.return_value = TIMESTAMP_A
         self.mock_local_clock.wait.side_effect = (
-            lambda _: self.clock_wait_event.set())
+            lambda *_: self.clock_wait_event.set())
         self.mock_sensor.reservoir_level.return_value = 500.0
 
-        reservoir_poller.start_polling_async()
+        _start_polling(self, self.mock_local_clock, reservoir_poller)
         self.clock_wait_event.wait(TEST_TIMEOUT_SECONDS)
-        self.mock_store.store_reservoir_level.assert_called_with(TIMESTAMP_A,
-                                                                 500.0)
-        self.mock_local_clock.wait.assert_called_with(POLL_INTERVAL)
+        self.mock_record_queue.put_nowait.assert_called_with(
+            (db_writer.RESERVOIR_LEVEL, TIMESTAMP_A, 500.0))
+        self.mock_local_clock.wait.assert_any_call(POLL_INTERVAL, mock.ANY)
 
+    def test_pollers_have_no_instance_dict(self):
+        sensor_pollers = [
+            poller.TemperaturePoller(self.mock_local_clock, POLL_INTERVAL,
+                                     self.mock_sensor, self.mock_record_queue),
+            poller.HumidityPoller(self.mock_local_clock, POLL_INTERVAL,
+                                  self.mock_sensor, self.mock_record_queue),
+            poller.AmbientLightPoller(self.mock_local_clock, POLL_INTERVAL,
+                                      self.mock_sensor, self.mock_record_queue),
+            poller.ReservoirPoller(self.mock_local_clock, POLL_INTERVAL,
+                                   self.mock_sensor, self.mock_record_queue),
+            poller.CompositeSensorPoller(self.mock_local_clock, POLL_INTERVAL,
+                                         [], self.mock_record_queue),
+            poller.SoilWateringPoller(self.mock_local_clock, POLL_INTERVAL,
+                                      self.mock_sensor,
+                                      mock.Mock(), self.mock_record_queue),
+            poller.CameraPoller(self.mock_local_clock, POLL_INTERVAL,
+                                mock.Mock()),
+        ]
+        for sensor_poller in sensor_pollers:
+            self.assertFalse(hasattr(sensor_poller, '__dict__'))
 
-class WateringEventPollerTest(unittest.TestCase):
+
+class CompositeSensorPollerTest(unittest.TestCase):
+
+    def test_composite_sensor_poller(self):
+        mock_local_clock = mock.Mock()
+        mock_sensor = mock.Mock()
+        mock_record_queue = mock.Mock()
+        composite_poller = poller.CompositeSensorPoller(
+            mock_local_clock, POLL_INTERVAL,
+            [(mock_sensor.temperature, db_writer.TEMPERATURE),
+             (mock_sensor.humidity, db_writer.HUMIDITY)], mock_record_queue)
+        mock_local_clock.now.side_effect = [TIMESTAMP_A, TIMESTAMP_B]
+        mock_sensor.temperature.return_value = 21.0
+        mock_sensor.humidity.return_value = 50.0
+
+        composite_poller._poll_once()
+        mock_record_queue.put_nowait.assert_called_once_with(
+            [(db_writer.TEMPERATURE, TIMESTAMP_A, 21.0),
+             (db_writer.HUMIDITY, TIMESTAMP_A, 50.0)])
+
+
+class SoilWateringPollerTest(unittest.TestCase):
 
     def setUp(self):
         self.clock_wait_event = threading.Event()
         self.mock_local_clock = mock.Mock()
+        self.mock_moisture_sensor = mock.Mock()
         self.mock_pump_manager = mock.Mock()
-        self.mock_watering_event_store = mock.Mock()
-        self.mock_soil_moisture_store = mock.Mock()
+        self.mock_record_queue = mock.Mock()
 
-    def test_watering_event_poller_when_pump_run(self):
-        watering_event_poller = poller.WateringEventPoller(
-            self.mock_local_clock, POLL_INTERVAL, self.mock_pump_manager,
-            self.mock_watering_event_store, self.mock_soil_moisture_store)
+    def test_soil_watering_poller_when_pump_run(self):
+        soil_watering_poller = poller.SoilWateringPoller(
+            self.mock_local_clock, POLL_INTERVAL, self.mock_moisture_sensor,
+            self.mock_pump_manager, self.mock_record_queue)
         self.mock_local_clock.now.return_value = TIMESTAMP_A
         self.mock_local_clock.wait.side_effect = (
-            lambda _: self.clock_wait_event.set())
+            lambda *_: self.clock_wait_event.set())
+        self.mock_moisture_sensor.moisture.return_value = 100
         self.mock_pump_manager.pump_if_needed.return_value = 200
-        self.mock_soil_moisture_store.latest_soil_moisture.return_value = 100
 
-        watering_event_poller.start_polling_async()
+        _start_polling(self, self.mock_local_clock, soil_watering_poller)
         self.clock_wait_event.wait(TEST_TIMEOUT_SECONDS)
-        self.mock_watering_event_store.store_water_pumped.assert_called_with(
-            TIMESTAMP_A, 200)
-        self.mock_local_clock.wait.assert_called_with(POLL_INTERVAL)
+        self.mock_record_queue.put_nowait.assert_called_with(
+            [(db_writer.SOIL_MOISTURE, TIMESTAMP_A, 100),
+             (db_writer.WATERING_EVENT, TIMESTAMP_A, 200)])
+        self.mock_local_clock.wait.assert_any_call(POLL_INTERVAL, mock.ANY)
         self.mock_pump_manager.pump_if_needed.assert_called_with(100)
 
-    def test_watering_event_poller_when_pump_not_run(self):
-        watering_event_poller = poller.WateringEventPoller(
-            self.mock_local_clock, POLL_INTERVAL, self.mock_pump_manager,
-            self.mock_watering_event_store, self.mock_soil_moisture_store)
+    def test_soil_watering_poller_records_share_timestamp(self):
+        soil_watering_poller = poller.SoilWateringPoller(
+            self.mock_local_clock, POLL_INTERVAL, self.mock_moisture_sensor,
+            self.mock_pump_manager, self.mock_record_queue)
+        self.mock_local_clock.now.side_effect = [TIMESTAMP_A, TIMESTAMP_B]
+        self.mock_moisture_sensor.moisture.return_value = 100
+        self.mock_pump_manager.pump_if_needed.return_value = 200
+
+        soil_watering_poller._poll_once()
+        self.mock_record_queue.put_nowait.assert_called_once_with(
+            [(db_writer.SOIL_MOISTURE, TIMESTAMP_A, 100),
+             (db_writer.WATERING_EVENT, TIMESTAMP_A, 200)])
+
+    def test_soil_watering_poller_when_pump_not_run(self):
+        soil_watering_poller = poller.SoilWateringPoller(
+            self.mock_local_clock, POLL_INTERVAL, self.mock_moisture_sensor,
+            self.mock_pump_manager, self.mock_record_queue)
+        self.mock_local_clock.now.return_value = TIMESTAMP_A
         self.mock_local_clock.wait.side_effect = (
-            lambda _: self.clock_wait_event.set())
+            lambda *_: self.clock_wait_event.set())
+        self.mock_moisture_sensor.moisture.return_value = 500
         self.mock_pump_manager.pump_if_needed.return_value = 0
-        self.mock_soil_moisture_store.latest_soil_moisture.return_value = 500
 
-        watering_event_poller.start_polling_async()
+        _start_polling(self, self.mock_local_clock, soil_watering_poller)
         self.clock_wait_event.wait(TEST_TIMEOUT_SECONDS)
-        self.assertFalse(
-            self.mock_watering_event_store.store_water_pumped.called)
-        self.mock_local_clock.wait.assert_called_with(POLL_INTERVAL)
+        self.mock_record_queue.put_nowait.assert_called_with(
+            [(db_writer.SOIL_MOISTURE, TIMESTAMP_A, 500)])
+        self.mock_local_clock.wait.assert_any_call(POLL_INTERVAL, mock.ANY)
         self.mock_pump_manager.pump_if_needed.assert_called_with(500)
 
-    def test_watering_event_poller_when_moisture_is_None(self):
-        watering_event_poller = poller.WateringEventPoller(
-            self.mock_local_clock, POLL_INTERVAL, self.mock_pump_manager,
-            self.mock_watering_event_store, self.mock_soil_moisture_store)
-        self.mock_local_clock.wait.side_effect = (
-            lambda _: self.clock_wait_event.set())
-        self.mock_soil_moisture_store.latest_soil_moisture.return_value = None
+    def test_soil_watering_poller_drops_records_when_queue_full(self):
+        soil_watering_poller = poller.SoilWateringPoller(
+            self.mock_local_clock, POLL_INTERVAL, self.mock_moisture_sensor,
+            self.mock_pump_manager, self.mock_record_queue)
+        self.mock_local_clock.now.return_value = TIMESTAMP_A
+        self.mock_moisture_sensor.moisture.return_value = 100
+        self.mock_pump_manager.pump_if_needed.return_value = 200
+        self.mock_record_queue.put_nowait.side_effect = Queue.Full()
 
-        watering_event_poller.start_polling_async()
-        self.clock_wait_event.wait(TEST_TIMEOUT_SECONDS)
-        self.assertFalse(
-            self.mock_watering_event_store.store_water_pumped.called)
-        self.assertFalse(self.mock_pump_manager.pump_if_needed.called)
-        self.mock_local_clock.wait.assert_called_with(POLL_INTERVAL)
+        soil_watering_poller._poll_once()
+        self.mock_pump_manager.pump_if_needed.assert_called_with(100)
 
 
 class CameraPollerTest(unittest.TestCase):
 
     def test_camera_poller(self):
-        clock_wait_event = threading.Event()
+        save_photo_event = threading.Event()
         mock_local_clock = mock.Mock()
         mock_camera_manager = mock.Mock()
         camera_poller = poller.CameraPoller(mock_local_clock, POLL_INTERVAL,
                                             mock_camera_manager)
-        mock_local_clock.wait.side_effect = lambda _: clock_wait_event.set()
+        self.addCleanup(camera_poller.close)
+        mock_local_clock.now.return_value = TIMESTAMP_A
+        mock_camera_manager.save_photo.side_effect = (
+            lambda: save_photo_event.set())
+
+        _start_polling(self, mock_local_clock, camera_poller)
+        save_photo_event.wait(TEST_TIMEOUT_SECONDS)
+        mock_camera_manager.save_photo.assert_called()
+
+    def test_camera_poller_starts_worker_on_first_poll(self):
+        mock_camera_manager = mock.Mock()
+        camera_poller = poller.CameraPoller(mock.Mock(), POLL_INTERVAL,
+                                            mock_camera_manager)
+        self.addCleanup(camera_poller.close)
+        self.assertIsNone(camera_poller._worker)
+
+        camera_poller._poll_once()
+        self.assertTrue(camera_poller._worker.is_alive())
+
+    @mock.patch.object(poller, 'logger')
+    def test_camera_poller_keeps_saving_after_failed_photo(self, mock_logger):
+        second_photo_event = threading.Event()
+        save_photo_results = [IOError('dummy error'), None]
+
+        def save_photo():
+            result = save_photo_results.pop(0)
+            if result:
+                raise result
+            second_photo_event.set()
+
+        mock_camera_manager = mock.Mock()
+        mock_camera_manager.save_photo.side_effect = save_photo
+        camera_poller = poller.CameraPoller(mock.Mock(), POLL_INTERVAL,
+                                            mock_camera_manager)
+        self.addCleanup(camera_poller.close)
+
+        camera_poller._poll_once()
+        camera_poller._poll_once()
+        self.assertTrue(second_photo_event.wait(TEST_TIMEOUT_SECONDS))
+        self.assertTrue(mock_logger.exception.called)
+
+    def test_camera_poller_drops_captures_when_camera_is_busy(self):
+        save_photo_started_event = threading.Event()
+        camera_busy_event = threading.Event()
+
+        def save_photo():
+            save_photo_started_event.set()
+            camera_busy_event.wait(TEST_TIMEOUT_SECONDS)
+
+        mock_camera_manager = mock.Mock()
+        mock_camera_manager.save_photo.side_effect = save_photo
+        camera_poller = poller.CameraPoller(mock.Mock(), POLL_INTERVAL,
+                                            mock_camera_manager)
+        self.addCleanup(camera_poller.close)
+        self.addCleanup(camera_busy_event.set)
+
+        camera_poller._poll_once()
+        save_photo_started_event.wait(TEST_TIMEOUT_SECONDS)
+        for _ in range(poller._MAX_PENDING_CAPTURE_REQUESTS + 1):
+            camera_poller._poll_once()
+        self.assertTrue(camera_poller._capture_requests.full())
+        mock_camera_manager.save_photo.assert_called_once_with()
+
+
+class PollerSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mock_local_clock = mock.Mock()
+        self.mock_local_clock.now.return_value = TIMESTAMP_A
+        self.scheduler = poller.PollerScheduler(self.mock_local_clock)
+
+    def test_polls_each_poller_at_its_own_interval(self):
+        fast_poller = mock.Mock(_poll_interval=1, _enabled=True)
+        slow_poller = mock.Mock(_poll_interval=3, _enabled=True)
+        self.scheduler.add(fast_poller)
+        self.scheduler.add(slow_poller)
+
+        self.scheduler._poll_next()
+        self.assertEqual(1, fast_poller._poll_once.call_count)
+        self.assertFalse(self.mock_local_clock.wait.called)
+
+        self.scheduler._poll_next()
+        self.assertEqual(1, slow_poller._poll_once.call_count)
+        self.assertFalse(self.mock_local_clock.wait.called)
+
+        self.scheduler._poll_next()
+        self.assertEqual(2, fast_poller._poll_once.call_count)
+        self.assertEqual(1, slow_poller._poll_once.call_count)
+        self.mock_local_clock.wait.assert_called_once_with(1.0, mock.ANY)
+
+    def test_poll_duration_does_not_delay_next_poll(self):
+        sensor_poller = mock.Mock(_poll_interval=1, _enabled=True)
+        self.scheduler.add(sensor_poller)
+        self.mock_local_clock.now.return_value = (
+            TIMESTAMP_A + datetime.timedelta(seconds=0.25))
+
+        self.scheduler._poll_next()
+        self.scheduler._poll_next()
+        self.mock_local_clock.wait.assert_called_once_with(0.75, mock.ANY)
+        self.assertEqual(2, sensor_poller._poll_once.call_count)
+
+    @mock.patch.object(poller, 'logger')
+    def test_failing_poller_does_not_stop_other_pollers(self, mock_logger):
+        failing_poller = mock.Mock(_poll_interval=1, _enabled=True)
+        failing_poller._poll_once.side_effect = ValueError('dummy error')
+        healthy_poller = mock.Mock(_poll_interval=1, _enabled=True)
+        self.scheduler.add(failing_poller)
+        self.scheduler.add(healthy_poller)
+
+        for _ in range(4):
+            self.scheduler._poll_next()
+        self.assertEqual(2, failing_poller._poll_once.call_count)
+        self.assertEqual(2, healthy_poller._poll_once.call_count)
+        self.assertTrue(mock_logger.exception.called)
+
+    def test_overrunning_poll_does_not_cause_burst_of_polls(self):
+        sensor_poller = mock.Mock(_poll_interval=1, _enabled=True)
+        self.scheduler.add(sensor_poller)
+        self.mock_local_clock.now.return_value = (
+            TIMESTAMP_A + datetime.timedelta(seconds=5))
+
+        self.scheduler._poll_next()
+        self.scheduler._poll_next()
+        self.scheduler._poll_next()
+        self.assertEqual(3, sensor_poller._poll_once.call_count)
+        self.mock_local_clock.wait.assert_called_with(1.0, mock.ANY)
+
+    def test_overrunning_poll_skips_missed_polls_in_phase(self):
+        sensor_poller = mock.Mock(_poll_interval=10, _enabled=True)
+        self.scheduler.add(sensor_poller)
+        self.mock_local_clock.now.return_value = (
+            TIMESTAMP_A + datetime.timedelta(seconds=25))
+
+        self.scheduler._poll_next()
+        next_poll_time, _, _ = self.scheduler._schedule[0]
+        self.assertEqual(
+            TIMESTAMP_A + datetime.timedelta(seconds=30), next_poll_time)
+
+    def test_rejects_jitter_fraction_out_of_range(self):
+        for jitter_fraction in (-0.1, 0.5, 1.0):
+            with self.assertRaises(ValueError):
+                poller.PollerScheduler(
+                    self.mock_local_clock, jitter_fraction=jitter_fraction)
+
+    @mock.patch.object(poller.random, 'uniform', return_value=0.1)
+    def test_jitter_shifts_poll_without_drift(self, mock_uniform):
+        scheduler = poller.PollerScheduler(
+            self.mock_local_clock, jitter_fraction=0.2)
+        sensor_poller = mock.Mock(_poll_interval=10, _enabled=True)
+        scheduler.add(sensor_poller)
+
+        scheduler._poll_next()
+        self.mock_local_clock.wait.assert_called_once_with(1.0, mock.ANY)
+        mock_uniform.assert_called_once_with(-0.2, 0.2)
+        next_poll_time, _, _ = scheduler._schedule[0]
+        self.assertEqual(
+            TIMESTAMP_A + datetime.timedelta(seconds=10), next_poll_time)
+
+    @mock.patch.object(poller, 'logger')
+    def test_backward_clock_step_does_not_stall_polling(self, mock_logger):
+        sensor_poller = mock.Mock(_poll_interval=10, _enabled=True)
+        self.scheduler.add(sensor_poller)
+        self.scheduler._poll_next()
+        clock_stepped_time = TIMESTAMP_A - datetime.timedelta(hours=1)
+        self.mock_local_clock.now.return_value = clock_stepped_time
+
+        self.scheduler._poll_next()
+        self.assertFalse(self.mock_local_clock.wait.called)
+        self.assertEqual(2, sensor_poller._poll_once.call_count)
+        next_poll_time, _, _ = self.scheduler._schedule[0]
+        self.assertEqual(
+            clock_stepped_time + datetime.timedelta(seconds=10), next_poll_time)
+        self.assertTrue(mock_logger.warning.called)
+
+    @mock.patch.object(poller, 'logger')
+    def test_backward_clock_step_reschedules_all_pollers(self, mock_logger):
+        pollers = [
+            mock.Mock(
+                _poll_interval=10, _enabled=True) for _ in range(3)
+        ]
+        for p in pollers:
+            self.scheduler.add(p)
+        for _ in pollers:
+            self.scheduler._poll_next()
+        self.mock_local_clock.now.return_value = (
+            TIMESTAMP_A - datetime.timedelta(hours=1))
+
+        for _ in pollers:
+            self.scheduler._poll_next()
+        self.assertFalse(self.mock_local_clock.wait.called)
+        for p in pollers:
+            self.assertEqual(2, p._poll_once.call_count)
+
+    def test_polls_all_pollers_from_one_thread(self):
+        poll_threads = set()
+        all_polled_event = threading.Event()
+
+        def record_poll_thread():
+            poll_threads.add(threading.current_thread())
+            if len(poll_threads) == 1 and all(p._poll_once.called
+                                              for p in pollers):
+                all_polled_event.set()
+
+        pollers = [
+            mock.Mock(
+                _poll_interval=POLL_INTERVAL, _enabled=True) for _ in range(3)
+        ]
+        for p in pollers:
+            p._poll_once.side_effect = record_poll_thread
+            self.scheduler.add(p)
+
+        _run_scheduler(self, self.scheduler)
+        all_polled_event.wait(TEST_TIMEOUT_SECONDS)
+        self.assertTrue(all_polled_event.is_set())
+        self.assertEqual(1, len(poll_threads))
+
+    def test_closed_poller_is_removed_from_schedule(self):
+        open_poller = mock.Mock(_poll_interval=1, _enabled=True)
+        closed_poller = poller.CameraPoller(self.mock_local_clock, 1,
+                                            mock.Mock())
+        self.scheduler.add(open_poller)
+        self.scheduler.add(closed_poller)
+        closed_poller.close()
+
+        self.scheduler._poll_next()
+        self.scheduler._poll_next()
+        self.scheduler._poll_next()
+        self.assertEqual(2, open_poller._poll_once.call_count)
+        self.assertFalse(closed_poller._camera_manager.save_photo.called)
+
+    def test_poller_closed_during_wait_is_not_polled(self):
+        sensor_poller = poller.SoilWateringPoller(self.mock_local_clock, 1,
+                                                  mock.Mock(),
+                                                  mock.Mock(), mock.Mock())
+        self.scheduler.add(sensor_poller)
+        self.scheduler._poll_next()
+        sensor_poller._pump_if_needed.reset_mock()
+        self.mock_local_clock.wait.side_effect = (
+            lambda *_: sensor_poller.close())
+
+        self.scheduler._poll_next()
+        self.assertFalse(sensor_poller._pump_if_needed.called)
+        self.assertEqual([], self.scheduler._schedule)
+
+    def test_polling_stops_when_all_pollers_are_closed(self):
+        sensor_poller = poller.CameraPoller(self.mock_local_clock, 1,
+                                            mock.Mock())
+        self.scheduler.add(sensor_poller)
+        sensor_poller.close()
+
+        self.scheduler._poll_forever()
+        self.assertFalse(sensor_poller._camera_manager.save_photo.called)
+
+    @mock.patch.object(poller, 'logger')
+    def test_logs_all_pollers_once_when_polling_starts(self, mock_logger):
+        mock_logger.isEnabledFor.return_value = True
+        camera_poller = poller.CameraPoller(self.mock_local_clock, 1,
+                                            mock.Mock())
+        self.addCleanup(camera_poller.close)
+        reservoir_poller = poller.ReservoirPoller(self.mock_local_clock, 1,
+                                                  mock.Mock(), mock.Mock())
+        self.scheduler.add(camera_poller)
+        self.scheduler.add(reservoir_poller)
+        camera_poller.close()
+        reservoir_poller.close()
+
+        self.scheduler._poll_forever()
+        mock_logger.info.assert_any_call('Polling started for %s',
+                                         'CameraPoller, ReservoirPoller')
+
+    def test_close_interrupts_wait_for_next_poll(self):
+        polled_event = threading.Event()
+        sensor_poller = mock.Mock(_poll_interval=60, _enabled=True)
+        sensor_poller._poll_once.side_effect = lambda: polled_event.set()
+        self.scheduler.add(sensor_poller)
+        self.mock_local_clock.wait.side_effect = (
+            lambda seconds, interrupt_event: interrupt_event.wait(seconds))
+        polling_thread = threading.Thread(target=self.scheduler._poll_forever)
+        polling_thread.start()
+        polled_event.wait(TEST_TIMEOUT_SECONDS)
 
-        camera_poller.start_polling_async()
-        clock_wait_event.wait(TEST_TIMEOUT_SECONDS)
-        mock_camera_manager.save_photo.assert_called()
\ No newline at end of file
+        self.scheduler.close()
+        polling_thread.join(TEST_TIMEOUT_SECONDS)
+        self.assertFalse(polling_thread.is_alive())
+        sensor_poller._poll_once.assert_called_once_with()